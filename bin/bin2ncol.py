@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+
+import click
+from groupgraph import GroupGraphBinary
+from groupgraph import GroupGraphGen
+
+@click.command()
+@click.argument("bin_file", type=click.Path())
+@click.argument("ncol_file", type=click.Path())
+def go(bin_file, ncol_file):
+    """
+    Convert an edge-list file from the binary edge format (see
+    GroupGraphBinary) to NCOL format.
+    """
+    GroupGraphGen.from_binary(bin_file).write_ncol(ncol_file)
+    print("wrote {} edges".format(len(GroupGraphBinary(bin_file))))
+
+if __name__ == '__main__':
+    go()
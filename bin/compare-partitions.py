@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import click
+import itertools
+import os
+from partcompare import LabelArrays
+from partcompare import best_matches
+from partcompare import read_partition
+
+@click.command()
+@click.option("--level", type=int,
+        help="Level of the cluster files to compare (default: top level).")
+@click.option("--matches", is_flag=True,
+        help=("Also list, for each pair, the best match of each community"
+                " of the first partition in the second."))
+@click.argument("partition_files", nargs=-1, required=True,
+        type=click.Path(exists=True))
+def go(level, matches, partition_files):
+    """
+    Compares partitions of the group graph pairwise, over the gids they
+    all have. Each file is a cluster file written by comm_dendrogram.py or
+    comm_sweep.py, or a partition file of lines "gid community" written
+    with --partition-file or by comm_update.py.
+
+    For each pair it prints the normalized mutual information (NMI), the
+    adjusted Rand index (ARI), the variation of information (VI, in nats)
+    and the size-weighted mean Jaccard index of the best match of each
+    community of the first partition in the second (overlap).
+    """
+    if len(partition_files) < 2:
+        raise click.UsageError("give at least two partition files")
+    partitions = [read_partition(_, level=level) for _ in partition_files]
+    labels = LabelArrays(partitions)
+    names = [os.path.basename(_) for _ in partition_files]
+    print("compared over {} gids (of {})".format(len(labels.gids),
+        ", ".join(str(len(_)) for _ in partitions)))
+    print("file_1\tfile_2\tk_1\tk_2\tnmi\tari\tvi\toverlap")
+    pair_matches = []
+    for i, j in itertools.combinations(range(len(labels)), 2):
+        table = labels.contingency(i, j)
+        scores = labels.compare(i, j)
+        sizes, best, overlaps, jaccards = best_matches(table)
+        overlap = float((sizes * jaccards).sum() / max(sizes.sum(), 1))
+        print("{}\t{}\t{}\t{}\t{:.4f}\t{:.4f}\t{:.4f}\t{:.4f}".format(
+            names[i], names[j], scores["k1"], scores["k2"], scores["nmi"],
+            scores["ari"], scores["vi"], overlap))
+        if matches:
+            pair_matches.append((i, j, sizes, best, overlaps, jaccards))
+    for i, j, sizes, best, overlaps, jaccards in pair_matches:
+        print()
+        print("{} -> {}".format(names[i], names[j]))
+        print("community\tsize\tmatch\toverlap\tjaccard")
+        for row in zip(range(len(sizes)), sizes.tolist(), best.tolist(),
+                overlaps.tolist(), jaccards.tolist()):
+            print("{}\t{}\t{}\t{}\t{:.4f}".format(*row))
+
+if __name__ == '__main__':
+    go()
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import os
+import scipy.sparse
+import tempfile
+from groupgraph import GroupGraphBinary
+from groupgraph import GroupGraphChunks
+
+min_modularity_gain = 0.0000001  # Stop when a pass or level gains less.
+
+
+class CsrGraph:
+    def __init__(self, nodes, matrix):
+        """
+        An undirected weighted graph held as its symmetric adjacency matrix in
+        CSR form: matrix[i, j] is the weight of the edge between nodes[i] and
+        nodes[j], and matrix[i, i] is twice the weight of the self-loop at
+        nodes[i], so that the row sums are the node degrees, as networkx
+        counts them. The weights of duplicate edges are added.
+
+        This is the graph that the Louvain functions of this module take in
+        place of a networkx graph. The classmethod::
+
+            from_path(graph_file)
+
+        creates an instance from an NCOL or binary edge file.
+        """
+        self._nodes = nodes
+        self.matrix = matrix
+
+    @classmethod
+    def from_binary(cls, graph_file):
+        """
+        Create an instance from a binary edge file (see GroupGraphBinary).
+        """
+        graph = GroupGraphBinary(graph_file)
+        nodes = graph.nodes()
+        node_1, node_2, weight = graph.columns()
+        rows = np.concatenate((node_1, node_2))
+        cols = np.concatenate((node_2, node_1))
+        data = np.concatenate((weight, weight)).astype(np.float64)
+        del graph
+        matrix = scipy.sparse.coo_matrix((data, (rows, cols)),
+                shape=(len(nodes), len(nodes))).tocsr()
+        matrix.sum_duplicates()
+        return cls(nodes, matrix)
+
+    @classmethod
+    def from_path(cls, graph_file, workers=None, tmp_dir=None):
+        """
+        Create an instance from a binary edge file if graph_file has the
+        extension .bin, otherwise from an NCOL file, parsed by workers
+        processes into a temporary binary edge file in tmp_dir.
+        """
+        if os.path.splitext(graph_file)[1] == ".bin":
+            return cls.from_binary(graph_file)
+        with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+            bin_file = os.path.join(tmp, "edges.bin")
+            GroupGraphChunks.from_file(graph_file,
+                    workers=workers).write_binary(bin_file)
+            return cls.from_binary(bin_file)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def nodes(self):
+        """
+        Return the list of node names (gids), in matrix index order.
+        """
+        return self._nodes
+
+    def degrees(self):
+        """
+        Return the array of the weighted node degrees.
+        """
+        return np.asarray(self.matrix.sum(axis=1)).ravel()
+
+    def size(self):
+        """
+        Return the total edge weight, self-loops included.
+        """
+        return self.matrix.sum() / 2
+
+    def reindexed(self, nodes):
+        """
+        Return the adjacency matrix of the graph with its nodes numbered by
+        their index in nodes, a list of gids that includes all of them.
+        """
+        index = dict((gid, i) for i, gid in enumerate(nodes))
+        positions = np.array([index[_] for _ in self._nodes], dtype=np.int64)
+        coo = self.matrix.tocoo()
+        return scipy.sparse.coo_matrix(
+                (coo.data, (positions[coo.row], positions[coo.col])),
+                shape=(len(nodes), len(nodes))).tocsr()
+
+    def apply_delta(self, edges):
+        """
+        Return a new CsrGraph with the edges (gid_1, gid_2, weight) set to
+        their weights, which adds the edges that are new, reweights the
+        others and removes those of weight 0, and the list of the gids whose
+        edges changed. New gids are added as nodes; nodes whose edges are
+        all removed stay, with no edges.
+        """
+        nodes = list(self._nodes)
+        index = dict((gid, i) for i, gid in enumerate(nodes))
+        weights = dict()
+        for g1, g2, w in edges:
+            pair = []
+            for gid in (str(g1), str(g2)):
+                if gid not in index:
+                    index[gid] = len(nodes)
+                    nodes.append(gid)
+                pair.append(index[gid])
+            weights[(min(pair), max(pair))] = float(w)
+        matrix = self.reindexed(nodes)
+        if not weights:
+            return self.__class__(nodes, matrix), []
+        pairs = np.array(list(weights), dtype=np.int64)
+        rows, cols = pairs[:, 0], pairs[:, 1]
+        loops = rows == cols
+        # The diagonal holds twice the weight of a self-loop.
+        new = np.array(list(weights.values())) * np.where(loops, 2, 1)
+        diff = new - np.asarray(matrix[rows, cols]).ravel()
+        off = ~loops
+        delta = scipy.sparse.coo_matrix(
+                (np.concatenate((diff, diff[off])),
+                    (np.concatenate((rows, cols[off])),
+                        np.concatenate((cols, rows[off])))),
+                shape=matrix.shape)
+        matrix = (matrix + delta).tocsr()
+        matrix.eliminate_zeros()
+        changed = np.unique(np.concatenate((rows[diff != 0],
+            cols[diff != 0])))
+        return self.__class__(nodes, matrix), [nodes[_] for _ in changed]
+
+    def changed_nodes(self, old_graph):
+        """
+        Return the list of the gids of this graph whose edges differ from
+        their edges in old_graph, including the new gids that have edges.
+        """
+        own = set(self._nodes)
+        nodes = list(self._nodes) + [_ for _ in old_graph.nodes()
+                if _ not in own]
+        diff = self.reindexed(nodes) - old_graph.reindexed(nodes)
+        diff.eliminate_zeros()
+        changed = np.flatnonzero(np.diff(diff.indptr))
+        return [nodes[_] for _ in changed if _ < len(self._nodes)]
+
+    def to_networkx(self):
+        """
+        Return the graph as a networkx Graph, with float "weight" edge
+        attributes.
+        """
+        import networkx as nx
+        upper = scipy.sparse.triu(self.matrix).tocoo()
+        weights = np.where(upper.row == upper.col, upper.data / 2, upper.data)
+        graph = nx.Graph()
+        graph.add_nodes_from(self._nodes)
+        graph.add_weighted_edges_from(zip(
+            [self._nodes[_] for _ in upper.row.tolist()],
+            [self._nodes[_] for _ in upper.col.tolist()],
+            weights.tolist()))
+        return graph
+
+
+def _modularity(matrix, degrees, communities, resolution):
+    """
+    Return the modularity of the partition of the graph with adjacency
+    matrix (CSR) into communities (an array of community numbers per node).
+    """
+    two_m = degrees.sum()
+    if two_m == 0:
+        return 0.0
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    internal = communities[rows] == communities[matrix.indices]
+    num_communities = communities.max() + 1
+    inside = np.bincount(communities[rows[internal]],
+            weights=matrix.data[internal], minlength=num_communities)
+    totals = np.bincount(communities, weights=degrees,
+            minlength=num_communities)
+    return float((inside / two_m).sum()
+            - resolution * ((totals / two_m) ** 2).sum())
+
+
+def _check_random_state(seed):
+    """
+    Like community's check_random_state(): return the numpy RandomState
+    for seed, which is None (numpy's global RandomState), an int, or a
+    RandomState.
+    """
+    if seed is None or seed is np.random:
+        return np.random.mtrand._rand
+    if isinstance(seed, (int, np.integer)):
+        return np.random.RandomState(seed)
+    if isinstance(seed, np.random.RandomState):
+        return seed
+    raise ValueError("{!r} cannot be used to seed a numpy.random.RandomState"
+            " instance".format(seed))
+
+
+def _one_level(matrix, degrees, resolution, communities=None, nodes=None,
+        random_state=None):
+    """
+    Move the nodes of the graph with adjacency matrix (CSR) between
+    communities, starting from one community per node, or from the array
+    communities (numbers below the number of nodes) if given, until a pass
+    over the nodes raises the modularity by less than min_modularity_gain.
+    Only the nodes in the array nodes are moved, if given. Return the array
+    of the community number of each node, renumbered from 0.
+
+    The nodes are visited in a random order drawn from random_state (a
+    RandomState), the same for every pass, as community does: in index
+    order, the result depends on how the input happens to be sorted.
+
+    Each node is taken out of its community and put into the neighbouring
+    community with the largest modularity gain, if that is more than the
+    gain of putting it back. The gains against all the neighbouring
+    communities are computed at once from the node's row of the matrix,
+    with the node's connections to each community summed into a scratch
+    array indexed by community.
+    """
+    num_nodes = matrix.shape[0]
+    if communities is None:
+        communities = np.arange(num_nodes)
+    else:
+        communities = communities.copy()
+    if nodes is None:
+        nodes = np.arange(num_nodes)
+    nodes = random_state.permutation(nodes).tolist()
+    totals = np.bincount(communities, weights=degrees, minlength=num_nodes)
+    connections = np.zeros(num_nodes)
+    two_m = degrees.sum()
+    # The self-loops count toward the degrees but not toward the
+    # connections of a node to the community it joins.
+    off_diagonal = matrix.copy()
+    off_diagonal.setdiag(0)
+    off_diagonal.eliminate_zeros()
+    indptr = off_diagonal.indptr.tolist()
+    indices = off_diagonal.indices
+    data = off_diagonal.data
+    cur_mod = _modularity(matrix, degrees, communities, resolution)
+    while True:
+        modified = False
+        for node in nodes:
+            start, stop = indptr[node], indptr[node + 1]
+            if start == stop:
+                continue
+            community = communities[node]
+            degree_factor = resolution * degrees[node] / two_m
+            totals[community] -= degrees[node]
+            neighbour_communities = communities[indices[start:stop]]
+            np.add.at(connections, neighbour_communities, data[start:stop])
+            gains = connections[neighbour_communities] \
+                    - totals[neighbour_communities] * degree_factor
+            best = gains.argmax()
+            stay_gain = connections[community] \
+                    - totals[community] * degree_factor
+            connections[neighbour_communities] = 0
+            if gains[best] > stay_gain:
+                community = neighbour_communities[best]
+                communities[node] = community
+                modified = True
+            totals[community] += degrees[node]
+        if not modified:
+            break
+        new_mod = _modularity(matrix, degrees, communities, resolution)
+        if new_mod - cur_mod < min_modularity_gain:
+            break
+        cur_mod = new_mod
+    return np.unique(communities, return_inverse=True)[1]
+
+
+def _induced_matrix(matrix, communities):
+    """
+    Return the adjacency matrix of the graph whose nodes are communities,
+    where the weight between two communities is the sum of the weights
+    between their nodes, and each community has a self-loop of the weight
+    inside it.
+    """
+    num_communities = communities.max() + 1
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    induced = scipy.sparse.coo_matrix(
+            (matrix.data, (communities[rows], communities[matrix.indices])),
+            shape=(num_communities, num_communities)).tocsr()
+    induced.sum_duplicates()
+    return induced
+
+
+def generate_levels(graph, resolution=1.0, communities=None, nodes=None,
+        random_state=None):
+    """
+    Run the Louvain method on a CsrGraph and return its levels: a list of
+    arrays, where levels[0][i] is the community of node i, and
+    levels[l][c] is the community at level l of community c of level l - 1.
+    The first level starts from communities and moves only nodes, if given
+    (see _one_level()); the levels above it are found from scratch.
+    random_state is None, an int or a RandomState, and picks the order in
+    which the nodes are visited.
+    """
+    random_state = _check_random_state(random_state)
+    matrix = graph.matrix
+    degrees = graph.degrees()
+    if matrix.nnz == 0:
+        return [np.arange(len(graph))]
+    levels = []
+    mod = None
+    start_communities, start_nodes = communities, nodes
+    while True:
+        communities = _one_level(matrix, degrees, resolution,
+                communities=start_communities, nodes=start_nodes,
+                random_state=random_state)
+        start_communities = start_nodes = None
+        new_mod = _modularity(matrix, degrees, communities, resolution)
+        if mod is not None and new_mod - mod < min_modularity_gain:
+            break
+        levels.append(communities)
+        mod = new_mod
+        matrix = _induced_matrix(matrix, communities)
+        degrees = np.asarray(matrix.sum(axis=1)).ravel()
+    return levels
+
+
+def _levels_dendrogram(graph, levels):
+    dendrogram = [dict(zip(graph.nodes(), levels[0].tolist()))]
+    for communities in levels[1:]:
+        dendrogram.append(dict(enumerate(communities.tolist())))
+    return dendrogram
+
+
+def generate_dendrogram(graph, resolution=1.0, random_state=None):
+    """
+    Like community.generate_dendrogram(), for a CsrGraph: return a list of
+    dicts, where the first maps each node to its community and each of the
+    others maps the communities of the level before to theirs.
+    random_state seeds the node order (see generate_levels()).
+    """
+    return _levels_dendrogram(graph, generate_levels(graph,
+        resolution=resolution, random_state=random_state))
+
+
+def update_dendrogram(graph, partition, changed, resolution=1.0,
+        random_state=None):
+    """
+    Re-run the Louvain method on a CsrGraph whose edges changed since
+    partition, a dict of each gid to its community, was found, starting
+    from that partition. changed is the list of the gids whose edges
+    changed (see CsrGraph.apply_delta() and CsrGraph.changed_nodes()).
+    Return the dendrogram, as generate_dendrogram() does, which
+    random_state is passed to.
+
+    The changed gids and the gids not in partition start in communities of
+    their own, and the other gids in their communities in partition. Only
+    the nodes of the communities the changed gids were in, and the
+    neighbours of the changed gids, are moved in the first level, so when
+    little changed the first level costs little. The communities it yields
+    are then merged from scratch, which is quick as they are few.
+    """
+    numbers = dict()
+    communities = np.array([numbers.setdefault(partition[_], len(numbers))
+        if _ in partition else -1 for _ in graph.nodes()], dtype=np.int64)
+    index = dict((gid, i) for i, gid in enumerate(graph.nodes()))
+    changed = np.union1d(
+            np.array([index[_] for _ in changed if _ in index],
+                dtype=np.int64),
+            np.flatnonzero(communities < 0))
+    movable = np.isin(communities, communities[changed])
+    movable[changed] = True
+    movable[graph.matrix[changed].indices] = True
+    communities[changed] = len(numbers) + np.arange(len(changed))
+    communities = np.unique(communities, return_inverse=True)[1]
+    return _levels_dendrogram(graph, generate_levels(graph,
+        resolution=resolution, communities=communities,
+        nodes=np.flatnonzero(movable), random_state=random_state))
+
+
+def partition_at_level(dendrogram, level):
+    """
+    Like community.partition_at_level(): return the dict of each node to
+    its community at level of the dendrogram.
+    """
+    partition = dendrogram[0].copy()
+    for index in range(1, level + 1):
+        partition = dict((node, dendrogram[index][community])
+                for node, community in partition.items())
+    return partition
+
+
+def best_partition(graph, resolution=1.0, random_state=None):
+    """
+    Like community.best_partition(), for a CsrGraph: return the partition
+    of the top level of the dendrogram.
+    """
+    dendrogram = generate_dendrogram(graph, resolution=resolution,
+            random_state=random_state)
+    return partition_at_level(dendrogram, len(dendrogram) - 1)
+
+
+def read_partition(fpath):
+    """
+    Read a partition file of lines "gid community", as written by
+    write_partition(), into a dict of gid to community.
+    """
+    partition = dict()
+    with open(fpath) as pfp:
+        for line in pfp:
+            gid, community = line.split()
+            partition[gid] = int(community)
+    return partition
+
+
+def write_partition(fpath, partition):
+    """
+    Write a partition, a dict of gid to community, to a file of lines
+    "gid community", sorted by gid.
+    """
+    tmp_fpath = fpath + ".tmp"
+    with open(tmp_fpath, "w") as pfp:
+        for gid in sorted(partition):
+            print("{} {}".format(gid, partition[gid]), file=pfp)
+    os.replace(tmp_fpath, fpath)
+
+
+def modularity(partition, graph, resolution=1.0):
+    """
+    Like community.modularity(), for a CsrGraph: return the modularity of
+    partition, a dict of each node to its community.
+    """
+    numbers = dict()
+    communities = np.array([numbers.setdefault(partition[_], len(numbers))
+        for _ in graph.nodes()], dtype=np.int64)
+    if graph.matrix.nnz == 0:
+        raise ValueError("A graph without link has an undefined modularity")
+    return _modularity(graph.matrix, graph.degrees(), communities, resolution)
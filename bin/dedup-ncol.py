@@ -1,15 +1,25 @@
 #!/usr/bin/env python3
 
 import click
+import os
 from groupgraph import GroupGraphGen
 
-def dedup_from_ncol_file(ncol_file):
-    yield from GroupGraphGen.from_file(ncol_file).filter_dups() 
+def dedup_from_ncol_file(ncol_file, max_edges=None, tmp_dir=None,
+        workers=None):
+    yield from GroupGraphGen.from_path(ncol_file, workers=workers).filter_dups(
+            max_edges=max_edges, tmp_dir=tmp_dir)
 
 @click.command()
+@click.option("--max-edges", type=click.IntRange(min=1),
+        help=("Keep at most this many edges in memory, spilling the rest"
+                " to disk (default: keep all)."))
+@click.option("--tmp-dir", type=click.Path(),
+        help="Directory for spilled edges (default: system temp dir).")
+@click.option("--workers", default=1,
+        help="Number of worker processes parsing an NCOL ncol_file.")
 @click.argument("ncol_file", type=click.Path())
 @click.argument("out_file", type=click.Path())
-def go(ncol_file, out_file):
+def go(max_edges, tmp_dir, workers, ncol_file, out_file):
     """
     Removes duplicate edges from an edge-list file. The NCOL format is:
 
@@ -17,9 +27,20 @@ def go(ncol_file, out_file):
         node1 node2 weight
         node3 node4 weight
         ...
+
+    With --max-edges, memory use is bounded and the edges after the first
+    max-edges distinct ones are written grouped by hash partition.
+
+    Either file may instead be in the binary edge format (see
+    GroupGraphBinary), chosen by the extension .bin.
     """
+    if os.path.splitext(out_file)[1] == ".bin":
+        GroupGraphGen(dedup_from_ncol_file(ncol_file, max_edges=max_edges,
+            tmp_dir=tmp_dir, workers=workers)).write_binary(out_file)
+        return
     with click.open_file(out_file, "w") as ofp:
-        for g1, g2, w in dedup_from_ncol_file(ncol_file):
+        for g1, g2, w in dedup_from_ncol_file(ncol_file, max_edges=max_edges,
+                tmp_dir=tmp_dir, workers=workers):
             print("{} {} {}".format(str(g1), str(g2), int(w)), file=ofp)
 
 if __name__ == '__main__':
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+import click
+from graphexport import export_graph
+from graphexport import format_for_path
+from graphexport import formats
+from meetupdata import GroupGidMap
+
+
+@click.command()
+@click.option('--format', 'fmt', type=click.Choice(formats),
+        help=('Output format (default by the out-file extension: .graphml,'
+                ' .gexf, .net, .npz for csr, .igraph.npz for igraph).'))
+@click.option('--groups-file', 'groups_file', type=click.Path(),
+        help='File of group information (.json, .txt or .db) for node labels.')
+@click.option('--tmp-dir', 'tmp_dir', type=click.Path(),
+        help='Directory for the temporary binary edge and array files.')
+@click.option('--workers', default=1,
+        help='Number of worker processes parsing an NCOL edges file.')
+@click.argument('edges-file', type=click.Path(exists=True))
+@click.argument('out-file', type=click.Path())
+def go(fmt, groups_file, tmp_dir, workers, edges_file, out_file):
+    """
+    Export the group graph in edges-file (NCOL, or binary .bin) to out-file
+    for other graph tools, streaming the edges so that memory use does not
+    grow with their number.
+    """
+    if fmt is None:
+        fmt = format_for_path(out_file)
+        if fmt is None:
+            raise click.BadParameter(
+                    "cannot tell the format of {!r}; use --format".format(
+                        out_file), param_hint="out-file")
+    print("format: {}".format(fmt))
+    print("groups_file: {}".format(groups_file))
+    print("tmp_dir: {}".format(tmp_dir))
+    print("workers: {}".format(workers))
+    print("edges_file: {}".format(edges_file))
+    print("out_file: {}".format(out_file))
+    labels = None
+    if groups_file:
+        labels = GroupGidMap.from_file(groups_file)
+    export_graph(edges_file, out_file, fmt=fmt, labels=labels,
+            tmp_dir=tmp_dir, workers=workers)
+
+if __name__ == '__main__':
+    go()
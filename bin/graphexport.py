@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import os
+import tempfile
+from xml.sax.saxutils import escape
+from xml.sax.saxutils import quoteattr
+from groupgraph import GroupGraphBinary
+from groupgraph import GroupGraphGen
+from groupgraph import dflt_chunk_edges
+
+formats = ["graphml", "gexf", "pajek", "csr", "igraph"]
+format_exts = [
+    (".graphml", "graphml"),
+    (".gexf", "gexf"),
+    (".net", "pajek"),
+    (".igraph.npz", "igraph"),
+    (".npz", "csr"),
+]
+
+
+def format_for_path(fpath):
+    """
+    Return the export format for a file name, by its extension, or None.
+    """
+    for ext, fmt in format_exts:
+        if fpath.endswith(ext):
+            return fmt
+    return None
+
+
+def iter_edge_chunks(graph, chunk_edges=None):
+    """
+    Generate (node_1, node_2, weight) column chunks of the node ids and
+    weights of a GroupGraphBinary.
+    """
+    if chunk_edges is None:
+        chunk_edges = dflt_chunk_edges
+    node_1, node_2, weight = graph.columns()
+    for start in range(0, len(graph), chunk_edges):
+        stop = start + chunk_edges
+        yield node_1[start:stop], node_2[start:stop], weight[start:stop]
+
+
+def export_graphml(graph, fpath, labels=None):
+    """
+    Write a GroupGraphBinary as an undirected GraphML graph with an int
+    "weight" edge attribute, and a "label" node attribute from the dict
+    labels of gid to label, if given.
+    """
+    nodes = graph.nodes()
+    node_ids = [quoteattr(_) for _ in nodes]
+    with open(fpath, "w", encoding="utf-8") as ofp:
+        print('<?xml version="1.0" encoding="UTF-8"?>', file=ofp)
+        print('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">',
+                file=ofp)
+        if labels is not None:
+            print('  <key id="label" for="node" attr.name="label"'
+                    ' attr.type="string"/>', file=ofp)
+        print('  <key id="weight" for="edge" attr.name="weight"'
+                ' attr.type="int"/>', file=ofp)
+        print('  <graph id="G" edgedefault="undirected">', file=ofp)
+        for gid, node_id in zip(nodes, node_ids):
+            label = labels.get(gid) if labels is not None else None
+            if label is None:
+                print('    <node id={}/>'.format(node_id), file=ofp)
+            else:
+                print('    <node id={}><data key="label">{}</data></node>'
+                        .format(node_id, escape(label)), file=ofp)
+        for n1, n2, w in iter_edge_chunks(graph):
+            ofp.write("".join('    <edge source={} target={}>'
+                '<data key="weight">{}</data></edge>\n'.format(
+                    node_ids[a], node_ids[b], c)
+                for a, b, c in zip(n1.tolist(), n2.tolist(), w.tolist())))
+        print('  </graph>', file=ofp)
+        print('</graphml>', file=ofp)
+
+
+def export_gexf(graph, fpath, labels=None):
+    """
+    Write a GroupGraphBinary as an undirected GEXF 1.2 graph with edge
+    weights, labelling the nodes from the dict labels of gid to label if
+    given, or with their gids.
+    """
+    nodes = graph.nodes()
+    node_ids = [quoteattr(_) for _ in nodes]
+    with open(fpath, "w", encoding="utf-8") as ofp:
+        print('<?xml version="1.0" encoding="UTF-8"?>', file=ofp)
+        print('<gexf xmlns="http://www.gexf.net/1.2draft" version="1.2">',
+                file=ofp)
+        print('  <graph mode="static" defaultedgetype="undirected">',
+                file=ofp)
+        print('    <nodes>', file=ofp)
+        for gid, node_id in zip(nodes, node_ids):
+            label = labels.get(gid) if labels is not None else None
+            if label is None:
+                label = gid
+            print('      <node id={} label={}/>'.format(node_id,
+                quoteattr(label)), file=ofp)
+        print('    </nodes>', file=ofp)
+        print('    <edges>', file=ofp)
+        edge_id = 0
+        for n1, n2, w in iter_edge_chunks(graph):
+            ofp.write("".join('      <edge id="{}" source={} target={}'
+                ' weight="{}"/>\n'.format(edge_id + i, node_ids[a],
+                    node_ids[b], c)
+                for i, (a, b, c) in enumerate(zip(n1.tolist(), n2.tolist(),
+                    w.tolist()))))
+            edge_id += len(w)
+        print('    </edges>', file=ofp)
+        print('  </graph>', file=ofp)
+        print('</gexf>', file=ofp)
+
+
+def export_pajek(graph, fpath, labels=None):
+    """
+    Write a GroupGraphBinary as a Pajek .net file. Vertices are numbered
+    from 1 in node table order and labelled with their gids, or from the
+    dict labels of gid to label if given.
+    """
+    nodes = graph.nodes()
+    with open(fpath, "w", encoding="utf-8") as ofp:
+        print("*Vertices {}".format(len(nodes)), file=ofp)
+        for i, gid in enumerate(nodes):
+            label = labels.get(gid) if labels is not None else None
+            if label is None:
+                label = gid
+            print('{} "{}"'.format(i + 1, label.replace('"', "'")), file=ofp)
+        print("*Edges", file=ofp)
+        for n1, n2, w in iter_edge_chunks(graph):
+            ofp.write("".join("{} {} {}\n".format(a, b, c)
+                for a, b, c in zip((n1 + 1).tolist(), (n2 + 1).tolist(),
+                    w.tolist())))
+
+
+def export_csr(graph, fpath, tmp_dir=None):
+    """
+    Write a GroupGraphBinary as the symmetric weighted adjacency matrix of
+    the graph in CSR form, to an .npz file with the arrays indptr (int64),
+    indices (int32), data (int32) and nodes (the gids). It can be loaded
+    with::
+
+        d = np.load(fpath)
+        a = scipy.sparse.csr_matrix((d["data"], d["indices"], d["indptr"]))
+
+    Each edge appears twice, as (node_1, node_2) and (node_2, node_1). The
+    indices and data arrays are built in memory-mapped temporary files, a
+    chunk of edges at a time.
+    """
+    num_nodes = len(graph.nodes())
+    counts = np.zeros(num_nodes, dtype=np.int64)
+    for n1, n2, w in iter_edge_chunks(graph):
+        counts += np.bincount(n1, minlength=num_nodes)
+        counts += np.bincount(n2, minlength=num_nodes)
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    nnz = int(indptr[-1])
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        indices = np.lib.format.open_memmap(os.path.join(tmp, "indices.npy"),
+                mode="w+", dtype=np.int32, shape=(nnz,))
+        data = np.lib.format.open_memmap(os.path.join(tmp, "data.npy"),
+                mode="w+", dtype=np.int32, shape=(nnz,))
+        fill = indptr[:-1].copy()
+        for n1, n2, w in iter_edge_chunks(graph):
+            rows = np.concatenate((n1, n2))
+            cols = np.concatenate((n2, n1))
+            vals = np.concatenate((w, w))
+            order = np.argsort(rows, kind="stable")
+            rows, cols, vals = rows[order], cols[order], vals[order]
+            # Position of each entry among the entries of its row.
+            starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+            run_lengths = np.diff(np.r_[starts, len(rows)])
+            ranks = np.arange(len(rows)) - np.repeat(starts, run_lengths)
+            positions = fill[rows] + ranks
+            indices[positions] = cols
+            data[positions] = vals
+            fill[rows[starts]] += run_lengths
+        np.savez(fpath, indptr=indptr, indices=indices, data=data,
+                nodes=np.array(graph.nodes(), dtype=str))
+        del indices, data
+
+
+def export_igraph(graph, fpath, tmp_dir=None):
+    """
+    Write a GroupGraphBinary to an .npz file with the arrays igraph takes
+    to build a graph without parsing text: edges (int32, one row of two
+    vertex ids per edge), weight (int32) and name (the gids). It can be
+    loaded with::
+
+        d = np.load(fpath)
+        g = igraph.Graph(n=len(d["name"]), edges=d["edges"],
+                edge_attrs={"weight": d["weight"]},
+                vertex_attrs={"name": d["name"]})
+
+    The edges array is written a chunk at a time through a memory-mapped
+    temporary file.
+    """
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        edges = np.lib.format.open_memmap(os.path.join(tmp, "edges.npy"),
+                mode="w+", dtype=np.int32, shape=(len(graph), 2))
+        start = 0
+        for n1, n2, w in iter_edge_chunks(graph):
+            edges[start:start + len(w), 0] = n1
+            edges[start:start + len(w), 1] = n2
+            start += len(w)
+        np.savez(fpath, edges=edges, weight=graph.columns()[2],
+                name=np.array(graph.nodes(), dtype=str))
+        del edges
+
+
+def export_graph(source, fpath, fmt=None, labels=None, tmp_dir=None,
+        workers=None):
+    """
+    Export a graph to fpath in the format fmt (default by the extension of
+    fpath, see format_for_path()). The source is a binary edge file (.bin),
+    which is used in place, an NCOL file, or a GroupGraphGen or
+    GroupGraphChunks, which is first spooled to a temporary binary edge file
+    in tmp_dir. labels is an optional dict of gid to node label, or a
+    GroupGidMap whose group names are the labels, used by the graphml, gexf
+    and pajek formats.
+
+    Each exporter writes a chunk of edges at a time from the memory-mapped
+    columns of the binary edge file, so memory use grows with the number of
+    nodes but not with the number of edges.
+    """
+    if fmt is None:
+        fmt = format_for_path(fpath)
+    if fmt not in formats:
+        raise ValueError("unknown export format: {!r}".format(fmt))
+    if isinstance(source, str) and os.path.splitext(source)[1] == ".bin":
+        _export_binary(GroupGraphBinary(source), fpath, fmt, labels, tmp_dir)
+        return
+    if isinstance(source, str):
+        source = GroupGraphGen.from_file(source, workers=workers)
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        spool_fpath = os.path.join(tmp, "edges.bin")
+        source.write_binary(spool_fpath)
+        graph = GroupGraphBinary(spool_fpath)
+        _export_binary(graph, fpath, fmt, labels, tmp_dir)
+        del graph
+
+
+def _export_binary(graph, fpath, fmt, labels, tmp_dir):
+    if labels is not None and not isinstance(labels, dict):
+        values = labels.get_many(graph.nodes(), keys=["name"])
+        labels = dict((gid, value["name"]) for gid, value in values.items())
+    if fmt == "graphml":
+        export_graphml(graph, fpath, labels=labels)
+    elif fmt == "gexf":
+        export_gexf(graph, fpath, labels=labels)
+    elif fmt == "pajek":
+        export_pajek(graph, fpath, labels=labels)
+    elif fmt == "csr":
+        export_csr(graph, fpath, tmp_dir=tmp_dir)
+    else:
+        export_igraph(graph, fpath, tmp_dir=tmp_dir)
@@ -1,7 +1,238 @@
 #!/usr/bin/env python3
 
+import collections
+import heapq
+import io
+import itertools
+import mmap
+import multiprocessing
+import numpy as np
+import operator
+import os
 import re
+import shutil
+import struct
 import sys
+import tempfile
+
+dflt_num_partitions = 64
+dflt_chunk_size = 1 << 20  # Bytes of NCOL text read per chunk.
+dflt_chunk_edges = 65536  # Edges per chunk when chunking a generator.
+dflt_workers = 1
+dflt_tasks_per_worker = 2  # Byte ranges parsed ahead per worker process.
+dflt_sort_edges = 1 << 20  # Edges sorted in memory per run by merge_sort_edges.
+dflt_merge_fan_in = 64  # Runs merged at a time by merge_sort_edges.
+aggregations = ["first", "sum", "max", "mean"]
+dflt_aggregation = "first"
+
+
+def dedup_edges(edges, max_edges=None, num_partitions=None, tmp_dir=None,
+        depth=0):
+    """
+    A generator that filters out duplicate edges, keeping the first of each
+    (min(gid_1, gid_2), max(gid_1, gid_2)) pair.
+
+    With max_edges None all the pairs seen are kept in memory, and the edges
+    come out in input order. Otherwise at most max_edges pairs are kept: the
+    edges after the first max_edges distinct pairs are checked against them
+    and the rest are spilled to num_partitions files in tmp_dir by hash of
+    the pair. Each partition is then deduped the same way, and partitions
+    that are still too large are partitioned again. The edges kept are the
+    same, but the spilled ones come out grouped by partition. max_edges must
+    be at least 1.
+    """
+    if max_edges is not None and max_edges < 1:
+        raise ValueError("max_edges must be at least 1: {!r}".format(
+            max_edges))
+    if num_partitions is None:
+        num_partitions = dflt_num_partitions
+    seen = set()
+    edges = iter(edges)
+    for g1, g2, w in edges:
+        pair = (min(g1, g2), max(g1, g2))
+        if pair in seen:
+            continue
+        seen.add(pair)
+        yield g1, g2, w
+        if max_edges is not None and len(seen) >= max_edges:
+            break
+    else:
+        return
+    first_edge = next(edges, None)
+    if first_edge is None:
+        return
+    edges = itertools.chain([first_edge], edges)
+    part_dir = tempfile.mkdtemp(prefix="dedup-", dir=tmp_dir)
+    try:
+        part_files = [os.path.join(part_dir, "{}.ncol".format(i))
+                for i in range(num_partitions)]
+        part_fps = [open(_, "w") for _ in part_files]
+        part_sizes = [0] * num_partitions
+        try:
+            for g1, g2, w in edges:
+                pair = (min(g1, g2), max(g1, g2))
+                if pair in seen:
+                    continue
+                i = hash((depth, pair)) % num_partitions
+                part_fps[i].write("{} {} {}\n".format(g1, g2, w))
+                part_sizes[i] += 1
+        finally:
+            for part_fp in part_fps:
+                part_fp.close()
+        seen = None
+        for part_file, part_size in zip(part_files, part_sizes):
+            # A partition that is partitioned again only needs enough
+            # subpartitions for each to fit with room to spare.
+            yield from dedup_edges(GroupGraphGen.from_file(part_file),
+                    max_edges=max_edges,
+                    num_partitions=min(dflt_num_partitions,
+                        max(2, -(-2 * part_size // max_edges))),
+                    tmp_dir=part_dir, depth=depth + 1)
+            os.remove(part_file)
+    finally:
+        shutil.rmtree(part_dir)
+
+
+def _combine_weights(aggregation, value_1, value_2):
+    """
+    Combine the aggregated weights of two runs of the same edge.
+    """
+    if aggregation == "first":
+        return value_1
+    if aggregation == "max":
+        return max(value_1, value_2)
+    return value_1 + value_2
+
+
+def _aggregate_sorted(items, aggregation):
+    """
+    A generator that combines consecutive (gid_1, gid_2, value, count) items
+    for the same pair, keeping the first of them for aggregation "first",
+    and summing the counts.
+    """
+    current = None
+    for g1, g2, value, count in items:
+        if current is not None and current[0] == g1 and current[1] == g2:
+            current[2] = _combine_weights(aggregation, current[2], value)
+            current[3] += count
+            continue
+        if current is not None:
+            yield tuple(current)
+        current = [g1, g2, value, count]
+    if current is not None:
+        yield tuple(current)
+
+
+def _write_run(run_file, items):
+    with open(run_file, "w") as rfp:
+        for g1, g2, value, count in items:
+            rfp.write("{} {} {} {}\n".format(g1, g2, value, count))
+    return run_file
+
+
+def _read_run(run_file):
+    with open(run_file) as rfp:
+        for line in rfp:
+            g1, g2, value, count = line.split()
+            yield g1, g2, int(value), int(count)
+
+
+def _merge_runs(run_files):
+    """
+    Merge sorted run files into one sorted stream of items. Items with the
+    same pair come out in the order of the run files, so the first edge of
+    the input stays first.
+    """
+    return heapq.merge(*[_read_run(_) for _ in run_files],
+            key=operator.itemgetter(0, 1))
+
+
+def merge_sort_edges(edges, aggregation=None, max_edges=None,
+        merge_fan_in=None, tmp_dir=None):
+    """
+    A generator that produces the edges sorted by the pair (gid_1, gid_2),
+    with gid_1 <= gid_2 as strings, and one edge per pair. The weight of a
+    pair's edge comes from the weights of all its edges by aggregation::
+
+        first: the weight of the first edge in the input (as dedup_edges())
+        sum: the sum of the weights
+        max: the largest weight
+        mean: the mean weight, rounded to the nearest integer
+
+    This is an external merge sort: runs of at most max_edges edges are
+    sorted and aggregated in memory and spilled to files in tmp_dir, then
+    merged merge_fan_in runs at a time until one pass yields the output.
+    Memory use is bounded by max_edges, whatever the number of edges. Since
+    the output is sorted, later stages can merge it with other sorted edge
+    files or binary-search it for a pair. max_edges must be at least 1 and
+    merge_fan_in at least 2.
+
+    The weights are member counts: an edge whose weight is not a whole
+    number raises ValueError rather than being truncated.
+    """
+    if aggregation is None:
+        aggregation = dflt_aggregation
+    if aggregation not in aggregations:
+        raise ValueError("unknown aggregation: {!r}".format(aggregation))
+    if max_edges is None:
+        max_edges = dflt_sort_edges
+    if max_edges < 1:
+        raise ValueError("max_edges must be at least 1: {!r}".format(
+            max_edges))
+    if merge_fan_in is None:
+        merge_fan_in = dflt_merge_fan_in
+    if merge_fan_in < 2:
+        raise ValueError("merge_fan_in must be at least 2: {!r}".format(
+            merge_fan_in))
+    pair_key = operator.itemgetter(0, 1)
+    run_dir = tempfile.mkdtemp(prefix="merge-", dir=tmp_dir)
+    try:
+        run_files = []
+        def spill(run):
+            run_file = os.path.join(run_dir, "{}.run".format(len(run_files)))
+            run_files.append(_write_run(run_file,
+                _aggregate_sorted(sorted(run, key=pair_key), aggregation)))
+        run = []
+        for g1, g2, w in edges:
+            g1, g2 = str(g1), str(g2)
+            if g2 < g1:
+                g1, g2 = g2, g1
+            weight = int(w)
+            if weight != w and not isinstance(w, str):
+                raise ValueError("non-integer weight of edge {} {}: {!r}"
+                        .format(g1, g2, w))
+            run.append((g1, g2, weight, 1))
+            if len(run) >= max_edges:
+                spill(run)
+                run = []
+        if not run_files:
+            items = _aggregate_sorted(sorted(run, key=pair_key), aggregation)
+        else:
+            if run:
+                spill(run)
+            run = None
+            num_merged = 0
+            while len(run_files) > merge_fan_in:
+                merged_files = []
+                for i in range(0, len(run_files), merge_fan_in):
+                    merge_files = run_files[i:i + merge_fan_in]
+                    merged_file = os.path.join(run_dir,
+                            "merged-{}.run".format(num_merged))
+                    num_merged += 1
+                    merged_files.append(_write_run(merged_file,
+                        _aggregate_sorted(_merge_runs(merge_files),
+                            aggregation)))
+                    for run_file in merge_files:
+                        os.remove(run_file)
+                run_files = merged_files
+            items = _aggregate_sorted(_merge_runs(run_files), aggregation)
+        for g1, g2, value, count in items:
+            if aggregation == "mean":
+                value = int(round(value / count))
+            yield g1, g2, value
+    finally:
+        shutil.rmtree(run_dir)
+
 
 class GroupGraphGen:
     def __init__(self, gen):
@@ -22,7 +253,13 @@ class GroupGraphGen:
 
         which removes the one that comes lexicographically second. Note that
         filter_dups() has to save the edges (so it can tell when it has seen an
-        edge before) so it is memory intensive.
+        edge before) so it is memory intensive, unless it is given max_edges
+        to spill edges to disk (see dedup_edges()). To merge the duplicates
+        instead, with their weights summed, averaged, etc., use::
+
+            .merge_dups(aggregation)
+
+        which sorts the edges on disk (see merge_sort_edges()).
 
         This class creates an instance from a generator of edges. When the
         source of the edges is a file, the classmethod::
@@ -35,11 +272,21 @@ class GroupGraphGen:
 
             .filter_edges_by_weight_range(...)
             .filter_edges_by_gid_regexes(...)
+
+        For large graphs, GroupGraphChunks runs the same filters on chunks
+        of edges as arrays; see chunked() and GroupGraphChunks.from_file().
         """
         self.gen = gen
 
     @classmethod
-    def from_file(cls, graph_file):
+    def from_file(cls, graph_file, workers=None):
+        """
+        Create an instance from an NCOL file. With workers > 1 the file is
+        parsed in parallel (see GroupGraphChunks.from_file()).
+        """
+        if workers is not None and workers > 1:
+            return cls(iter(GroupGraphChunks.from_file(graph_file,
+                workers=workers)))
         def reader():
             with open(graph_file) as gfp:
                 for line in gfp:
@@ -49,6 +296,24 @@ class GroupGraphGen:
                     yield str(gid1), str(gid2), int(weight)
         return cls(reader())
 
+    @classmethod
+    def from_binary(cls, graph_file):
+        """
+        Create an instance from a binary edge file (see GroupGraphBinary).
+        """
+        return cls(iter(GroupGraphChunks.from_binary(graph_file)))
+
+    @classmethod
+    def from_path(cls, graph_file, workers=None):
+        """
+        Create an instance from a binary edge file if graph_file has the
+        extension .bin, otherwise from an NCOL file, parsed by workers
+        processes.
+        """
+        if os.path.splitext(graph_file)[1] == ".bin":
+            return cls.from_binary(graph_file)
+        return cls.from_file(graph_file, workers=workers)
+
     def __iter__(self):
         """
         A generator that produces each edge of the graph as a tuple
@@ -56,6 +321,20 @@ class GroupGraphGen:
         """
         yield from self.gen
 
+    def write_binary(self, graph_file):
+        """
+        Write the edges to a binary edge file (see GroupGraphBinary).
+        """
+        self.chunked().write_binary(graph_file)
+
+    def write_ncol(self, graph_file):
+        """
+        Write the edges to an NCOL file.
+        """
+        with open(graph_file, "w") as gfp:
+            for g1, g2, w in self.gen:
+                print("{} {} {}".format(g1, g2, w), file=gfp)
+
     def filter(self, gen):
         return self.__class__(gen)
 
@@ -94,15 +373,448 @@ class GroupGraphGen:
                     yield g1, g2, w
         return self.filter(regex_filter())
 
-    def filter_dups(self):
+    def filter_dups(self, max_edges=None, tmp_dir=None):
         """
-        A generator that filters out duplicate edges.
+        A generator that filters out duplicate edges. With max_edges, at most
+        that many edges are kept in memory and the rest are deduped on disk
+        in tmp_dir (see dedup_edges()).
         """
-        def dups_filter():
-            dups = set()
-            for g1, g2, w in self.gen:
-                if (min(g1, g2), max(g1, g2)) in dups:
-                    continue
-                dups.add((min(g1, g2), max(g1, g2)))
-                yield g1, g2, w
-        return self.filter(dups_filter())
+        return self.filter(dedup_edges(self.gen, max_edges=max_edges,
+            tmp_dir=tmp_dir))
+
+    def merge_dups(self, aggregation=None, max_edges=None, tmp_dir=None):
+        """
+        A generator that merges duplicate edges into one, with the weight
+        aggregated from theirs by aggregation (first, sum, max or mean), and
+        produces the edges sorted by pair. At most max_edges edges are kept
+        in memory and the rest are sorted on disk in tmp_dir (see
+        merge_sort_edges()).
+        """
+        return self.filter(merge_sort_edges(self.gen, aggregation=aggregation,
+            max_edges=max_edges, tmp_dir=tmp_dir))
+
+    def chunked(self, chunk_edges=None):
+        """
+        Return the edges as a GroupGraphChunks, in chunks of chunk_edges.
+        """
+        return GroupGraphChunks.from_edges(self.gen, chunk_edges=chunk_edges)
+
+
+_powers_of_10 = 10 ** np.arange(19, dtype=np.int64)
+
+
+def parse_ncol_chunk(text, num_lines, graph_file=None):
+    """
+    Parse num_lines lines of NCOL text into columns (gid_1, gid_2, weight).
+    When every field is a plain decimal number, which is the case for
+    Meetup group ids, the whole text is parsed in one NumPy call and the gid
+    columns are int64 arrays. Otherwise they are arrays of strings.
+    """
+    num_chars = len(text) - sum(text.count(_) for _ in " \t\r\n")
+    numbers = np.empty(0, dtype=np.int64)
+    if num_chars:
+        try:
+            numbers = np.loadtxt(io.StringIO(text), dtype=np.int64,
+                    comments=None, ndmin=2).ravel()
+        except ValueError:
+            pass
+    # The numbers stand for the text exactly when they have as many digits
+    # as there are non-blank characters (no signs, leading zeros, etc.).
+    digits = np.maximum(np.searchsorted(_powers_of_10, numbers,
+        side="right"), 1)
+    if len(numbers) == 3 * num_lines and digits.sum() == num_chars:
+        columns = numbers.reshape(-1, 3)
+        return columns[:, 0], columns[:, 1], columns[:, 2]
+    fields = text.split()
+    if len(fields) != 3 * num_lines:
+        raise ValueError("bad NCOL line in {!r}".format(graph_file))
+    columns = np.array(fields).reshape(-1, 3)
+    return columns[:, 0], columns[:, 1], columns[:, 2].astype(np.int64)
+
+
+def ncol_byte_ranges(graph_file, range_size):
+    """
+    Return a list of (start, stop) byte ranges of about range_size bytes
+    that cover graph_file, each starting at the beginning of a line.
+    """
+    file_size = os.path.getsize(graph_file)
+    bounds = [0]
+    with open(graph_file, "rb") as gfp:
+        while bounds[-1] < file_size:
+            gfp.seek(bounds[-1] + range_size)
+            gfp.readline()
+            bounds.append(min(gfp.tell(), file_size))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _parse_ncol_range(task):
+    """
+    Worker for parse_ncol_ranges(): parse the lines of a byte range.
+    """
+    graph_file, start, stop = task
+    with open(graph_file, "rb") as gfp:
+        gfp.seek(start)
+        text = gfp.read(stop - start).decode("utf-8")
+    num_lines = text.count("\n") + (not text.endswith("\n"))
+    return parse_ncol_chunk(text, num_lines, graph_file)
+
+
+def parse_ncol_ranges(graph_file, range_size, workers):
+    """
+    A generator that parses graph_file in byte ranges of about range_size
+    bytes (see ncol_byte_ranges()) with a pool of workers processes, and
+    produces the chunks in file order. At most dflt_tasks_per_worker
+    ranges per worker are parsed ahead of the consumer.
+    """
+    tasks = [(graph_file, start, stop)
+            for start, stop in ncol_byte_ranges(graph_file, range_size)]
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(workers) as pool:
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.apply_async(_parse_ncol_range, (task,)))
+            if len(pending) >= workers * dflt_tasks_per_worker:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+class GroupGraphChunks:
+    def __init__(self, chunks):
+        """
+        The chunked form of GroupGraphGen: the edges flow as chunks of
+        columns (gid_1 array, gid_2 array, weight array), so the filters are
+        array operations on a whole chunk instead of Python code run for
+        each edge. When the source of the edges is a file, the classmethod::
+
+            from_file(graph_file)
+
+        reads it a chunk of text at a time. The filters are the same as
+        those of GroupGraphGen::
+
+            .filter_edges_by_weight_range(...)
+            .filter_edges_by_gid_regexes(...)
+            .filter_dups(...)
+
+        Iterating over the instance generates the edges one at a time as
+        GroupGraphGen does; iter_chunks() generates the chunks.
+        """
+        self.chunks = chunks
+
+    @classmethod
+    def from_file(cls, graph_file, chunk_size=None, workers=None):
+        """
+        Create an instance from an NCOL file, read chunk_size bytes of text
+        at a time. With workers > 1 the file is split into byte ranges of
+        about chunk_size bytes at line boundaries, which a pool of worker
+        processes parse; the chunks still come out in file order.
+        """
+        if chunk_size is None:
+            chunk_size = dflt_chunk_size
+        if workers is None:
+            workers = dflt_workers
+        if workers > 1:
+            return cls(parse_ncol_ranges(graph_file, chunk_size, workers))
+        def reader():
+            with open(graph_file) as gfp:
+                while True:
+                    lines = gfp.readlines(chunk_size)
+                    if not lines:
+                        break
+                    yield parse_ncol_chunk("".join(lines), len(lines),
+                            graph_file)
+        return cls(reader())
+
+    @classmethod
+    def from_binary(cls, graph_file, chunk_edges=None):
+        """
+        Create an instance from a binary edge file (see GroupGraphBinary).
+        """
+        return cls(GroupGraphBinary(graph_file).iter_chunks(
+            chunk_edges=chunk_edges))
+
+    @classmethod
+    def from_edges(cls, edges, chunk_edges=None):
+        """
+        Create an instance from a generator of edges (gid_1, gid_2, weight).
+        """
+        if chunk_edges is None:
+            chunk_edges = dflt_chunk_edges
+        def chunker():
+            edges_iter = iter(edges)
+            while True:
+                chunk = list(itertools.islice(edges_iter, chunk_edges))
+                if not chunk:
+                    break
+                g1, g2, w = zip(*chunk)
+                yield (np.array(g1, dtype=str), np.array(g2, dtype=str),
+                        np.array(w, dtype=np.int64))
+        return cls(chunker())
+
+    def __iter__(self):
+        """
+        A generator that produces each edge of the graph as a tuple
+        (str(gid_1), str(gid_2), int(weight)).
+        """
+        for g1, g2, w in self.chunks:
+            yield from zip(map(str, g1.tolist()), map(str, g2.tolist()),
+                    w.tolist())
+
+    def iter_chunks(self):
+        """
+        A generator that produces each chunk of edges as a tuple of arrays
+        (gid_1, gid_2, weight). The gid arrays hold int64 gids or strings
+        (see parse_ncol_chunk()).
+        """
+        yield from self.chunks
+
+    def concatenate(self):
+        """
+        Return all the edges as one tuple of arrays (gid_1, gid_2, weight).
+        """
+        chunks = list(self.chunks)
+        if not chunks:
+            return (np.empty(0, dtype=str), np.empty(0, dtype=str),
+                    np.empty(0, dtype=np.int64))
+        return tuple(np.concatenate(_) for _ in zip(*chunks))
+
+    def filter(self, chunks):
+        return self.__class__(chunks)
+
+    def filter_mask(self, mask_func):
+        """
+        Keep the edges of each chunk (g1, g2, w) where the boolean array
+        mask_func(g1, g2, w) is True.
+        """
+        def mask_filter():
+            for g1, g2, w in self.chunks:
+                mask = mask_func(g1, g2, w)
+                if mask.all():
+                    yield g1, g2, w
+                elif mask.any():
+                    yield g1[mask], g2[mask], w[mask]
+        return self.filter(mask_filter())
+
+    def filter_edges_by_weight_range(self, min_weight=None, max_weight=None):
+        """
+        Filter the edges of the graph by weight range.
+        """
+        def weight_mask(g1, g2, w):
+            mask = np.ones(len(w), dtype=bool)
+            if min_weight is not None:
+                mask &= w >= min_weight
+            if max_weight is not None:
+                mask &= w <= max_weight
+            return mask
+        return self.filter_mask(weight_mask)
+
+    def filter_edges_by_gid_regexes(self, regex_list=None):
+        """
+        Filter the edges of the graph to those where both group_ids match
+        the same regex of a list of regexes. Each distinct gid of a chunk is
+        matched once (see GidRegexMatcher).
+        """
+        matcher = GidRegexMatcher(regex_list)
+        def regex_mask(g1, g2, w):
+            gids, inverse = np.unique(np.concatenate((g1, g2)),
+                    return_inverse=True)
+            masks = matcher.masks(gids.tolist())[inverse]
+            return (masks[:len(g1)] & masks[len(g1):]) != 0
+        return self.filter_mask(regex_mask)
+
+    def filter_dups(self, max_edges=None, tmp_dir=None):
+        """
+        Filter out duplicate edges (see dedup_edges()).
+        """
+        return self.from_edges(dedup_edges(iter(self), max_edges=max_edges,
+            tmp_dir=tmp_dir))
+
+    def edges(self):
+        """
+        Return the edges as a GroupGraphGen.
+        """
+        return GroupGraphGen(iter(self))
+
+    def write_binary(self, graph_file):
+        """
+        Write the edges to a binary edge file (see GroupGraphBinary).
+        """
+        GroupGraphBinary.write(graph_file, self.chunks)
+
+
+class GroupGraphBinary:
+    """
+    Class for accessing a memory-mapped binary edge file. The layout (all
+    little-endian) is:
+
+        header          magic, num_edges, num_nodes, node_table_bytes
+                        (struct format "<8s3Q")
+        node_1          int32[num_edges], node ids of the first ends
+        node_2          int32[num_edges], node ids of the second ends
+        weight          int32[num_edges]
+        node table      the gids, UTF-8, separated by newlines
+
+    Edge i is (nodes[node_1[i]], nodes[node_2[i]], weight[i]), where nodes is
+    the list of gids of the node table, in order of first appearance in the
+    edges.
+    """
+
+    magic = b"MUEDGS01"
+    header_format = "<8s3Q"
+
+    def __init__(self, fpath):
+        self._fpath = fpath
+        with open(fpath, "rb") as gfp:
+            self._mmap = mmap.mmap(gfp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, num_edges, num_nodes, node_table_bytes = struct.unpack_from(
+                self.header_format, self._mmap)
+        if magic != self.magic:
+            raise RuntimeError("not a binary edge file: {!r}".format(fpath))
+        pos = struct.calcsize(self.header_format)
+        columns = []
+        for _ in range(3):
+            columns.append(np.frombuffer(self._mmap, dtype="<i4",
+                count=num_edges, offset=pos))
+            pos += 4 * num_edges
+        self._node_1, self._node_2, self._weight = columns
+        node_table = self._mmap[pos:pos + node_table_bytes].decode("utf-8")
+        self._node_list = node_table.split("\n") if num_nodes else []
+
+    @classmethod
+    def write(cls, fpath, chunks):
+        """
+        Write chunks of edges (gid_1 array, gid_2 array, weight array) to a
+        binary edge file. The columns are streamed to temporary files as the
+        chunks arrive, so only the node table is held in memory. The file is
+        written to a temporary file which then replaces the old one.
+        """
+        node_index = dict()
+        num_edges = 0
+        tmp_fpath = fpath + ".tmp"
+        column_fpaths = ["{}.{}".format(tmp_fpath, _) for _ in range(3)]
+        try:
+            column_fps = [open(_, "wb") for _ in column_fpaths]
+            try:
+                for g1, g2, w in chunks:
+                    gids, inverse = np.unique(np.concatenate((g1, g2)),
+                            return_inverse=True)
+                    ids = np.array([node_index.setdefault(str(gid),
+                        len(node_index)) for gid in gids.tolist()],
+                        dtype="<i4")
+                    node_ids = ids[inverse]
+                    column_fps[0].write(node_ids[:len(g1)].tobytes())
+                    column_fps[1].write(node_ids[len(g1):].tobytes())
+                    column_fps[2].write(np.asarray(w, dtype="<i4").tobytes())
+                    num_edges += len(g1)
+            finally:
+                for column_fp in column_fps:
+                    column_fp.close()
+            node_table = "\n".join(node_index).encode("utf-8")
+            with open(tmp_fpath, "wb") as gfp:
+                gfp.write(struct.pack(cls.header_format, cls.magic,
+                    num_edges, len(node_index), len(node_table)))
+                for column_fpath in column_fpaths:
+                    with open(column_fpath, "rb") as column_fp:
+                        shutil.copyfileobj(column_fp, gfp)
+                gfp.write(node_table)
+        finally:
+            for column_fpath in column_fpaths:
+                if os.path.exists(column_fpath):
+                    os.remove(column_fpath)
+        os.replace(tmp_fpath, fpath)
+
+    def __len__(self):
+        return len(self._weight)
+
+    def nodes(self):
+        """
+        Return the list of gids of the node table.
+        """
+        return self._node_list
+
+    def columns(self):
+        """
+        Return the arrays (node_1, node_2, weight) of the file, without
+        copying.
+        """
+        return self._node_1, self._node_2, self._weight
+
+    def iter_chunks(self, chunk_edges=None):
+        """
+        Generate chunks of edges (gid_1 array, gid_2 array, weight array).
+        """
+        if chunk_edges is None:
+            chunk_edges = dflt_chunk_edges
+        nodes = np.array(self._node_list)
+        for start in range(0, len(self), chunk_edges):
+            stop = start + chunk_edges
+            yield (nodes[self._node_1[start:stop]],
+                    nodes[self._node_2[start:stop]],
+                    self._weight[start:stop].astype(np.int64))
+
+
+class GidRegexMatcher:
+    def __init__(self, regex_list):
+        """
+        Match gids against a list of regexes (patterns or strings), giving
+        each gid a bit mask of the regexes that match it. When it does not
+        change what they mean, the regexes are also combined into one
+        alternation, which rejects most gids that match none of them in a
+        single match() call. Masks are cached, since the same gids come up
+        again and again in a graph.
+        """
+        self.regex_list = [re.compile(_) for _ in regex_list]
+        self.combined = self._combine(self.regex_list)
+        # Bit masks of up to 63 regexes fit in an int64 array.
+        if len(self.regex_list) < 64:
+            self.dtype = np.int64
+        else:
+            self.dtype = object
+        self.cache = dict()
+
+    # Group references and inline flags, which mean something else, or are
+    # not allowed, once the patterns are joined into one.
+    _uncombinable = re.compile(r"\\[1-9]|\\g<|\(\?P?[<=(]|\(\?[aiLmsux-]")
+
+    @classmethod
+    def _combine(cls, regex_list):
+        """
+        Return the alternation of the compiled regexes in regex_list, or
+        None if they cannot be joined without changing their meaning: they
+        have different flags, or a pattern uses group references, named
+        groups or inline flags.
+        """
+        flags = set(_.flags for _ in regex_list)
+        if len(flags) != 1:
+            return None
+        patterns = [_.pattern for _ in regex_list]
+        if any(cls._uncombinable.search(_ if isinstance(_, str) else
+                _.decode("latin-1")) for _ in patterns):
+            return None
+        try:
+            return re.compile("|".join("(?:{})".format(_) for _ in patterns),
+                    flags.pop())
+        except re.error:
+            return None
+
+    def mask(self, gid):
+        """
+        Return the bit mask of the regexes that match gid (a str, or an int
+        standing for its decimal string).
+        """
+        mask = self.cache.get(gid)
+        if mask is None:
+            mask = 0
+            gid_str = str(gid)
+            if self.combined is None or self.combined.match(gid_str):
+                for i, r in enumerate(self.regex_list):
+                    if r.match(gid_str):
+                        mask |= 1 << i
+            self.cache[gid] = mask
+        return mask
+
+    def masks(self, gids):
+        """
+        Return an array of the bit masks of gids.
+        """
+        return np.array([self.mask(_) for _ in gids], dtype=self.dtype)
@@ -45,8 +45,9 @@ if __name__ == '__main__':
                         group_ids_json=group_ids_json,
                         group_ids_str=group_ids_str,
                         )
+        values = gid_map.get_many(gid_set, keys=[key])
         for gid in sorted(gid_set):
-            yield gid, gid_map.get(gid, key)
+            yield gid, values.get(gid, {}).get(key, None)
 
     @click.command()
     @click.option('--gids-file', 'group_ids_file', type=click.Path(),
@@ -59,14 +60,26 @@ if __name__ == '__main__':
             help='Field to return (name, members, description).')
     @click.option('--groups-file', 'groups_file', type=click.Path(),
             default=dflt_groups_file,
-            help='File of group information (.json or .txt.')
-    def go(group_ids_file, group_ids_json, group_ids_str, key, groups_file):
+            help='File of group information (.json, .txt or .db).')
+    @click.option('--lazy/--no-lazy', 'lazy',
+            help=('Read only the records of the group_ids from a .json'
+                ' groups file, through an index saved next to it, instead'
+                ' of loading the whole file.'))
+    @click.option('--write-db', 'db_file', type=click.Path(),
+            help='Also write the groups file to this SQLite .db file.')
+    def go(group_ids_file, group_ids_json, group_ids_str, key, groups_file,
+            lazy, db_file):
         print("group_ids_file: {!r}".format(group_ids_file))
         print("group_ids_json: {!r}".format(group_ids_json))
         print("group_ids_str: {!r}".format(group_ids_str))
         print("groups_file: {!r}".format(groups_file))
-        gid_map = GroupGidMap.from_file(groups_file)
+        print("lazy: {!r}".format(lazy))
+        print("db_file: {!r}".format(db_file))
+        gid_map = GroupGidMap.from_file(groups_file, lazy=lazy)
         print("read {} group names from {!r}".format(len(gid_map), groups_file))
+        if db_file:
+            gid_map.write_db(db_file)
+            print("wrote {} groups to {!r}".format(len(gid_map), db_file))
         all_values = group_values_gen(
                         group_ids_file=group_ids_file,
                         group_ids_str=group_ids_str,
@@ -1,17 +1,28 @@
 #!/usr/bin/env python3
 
+from collections import defaultdict
 from functools import partial
 from itertools import combinations
 import click
+import numpy as np
 import os
 import random
+import scipy.sparse as sp
+from groupgraph import GroupGraphGen
 from meetupdata import GroupsData
+from workerpool import make_shards
+from workerpool import make_triangle_shards
+from workerpool import map_tasks
+from workerpool import shared
 
 dflt_seed = None
 dflt_k = 1      # Number of members two groups must have in common.
 dflt_p = 0.05   # Percent membership each of two groups must share.
 dflt_num = 100  # Number of edges to generate.
 dflt_max_null_passes=10000  # Stop if no random edge after this many trys.
+dflt_workers = 1    # Number of worker processes.
+dflt_engine = "triangles"
+engines = ["triangles", "combinations"]
 
 
 def gen_random_3cliques(source, k=None, p=None, n=None, seed=None,
@@ -44,7 +55,7 @@ def gen_random_3cliques(source, k=None, p=None, n=None, seed=None,
     if ext == ".json":
         g = GroupsData.from_file(source)
     else:
-        g = GroupsData.from_stash(source)
+        g = GroupsData.from_stash(source, fields=["id"])
 
     node_data = dict()
     for gid in g.get_gids():
@@ -115,7 +126,7 @@ def gen_random_3cliques(source, k=None, p=None, n=None, seed=None,
                     min(num_common_12, num_common_13, num_common_23) == 0
                     or max(num_common_123/num_common_12,
                             num_common_123/num_common_13,
-                            num_common_123/num_common_23) < p)
+                            num_common_123/num_common_23) < p
                 ):
                 p_good_to_go = False
         if k_good_to_go or p_good_to_go:
@@ -147,12 +158,15 @@ def gen_random_3cliques(source, k=None, p=None, n=None, seed=None,
     print("{} edges".format(count_tris_emitted))
 
 
-def gen_3cliques(source, k=None, p=None, n=None):
+def gen_3cliques(source, k=None, p=None, n=None, workers=None):
     """
     Generate at most n edges of the group graph from JSON data stored in a
     directory stash or file (source extension .json). Constructs at most n
     triangles (3-cliques) where the three nodes of a triangle have at least k
     members in common.
+
+    With workers > 1 the triangles are found by a pool of worker processes
+    (see gen_3cliques_sharded()).
     """
 
     if not k and not p:
@@ -163,6 +177,13 @@ def gen_3cliques(source, k=None, p=None, n=None):
         p = dflt_p
     if n is None:
         n = dflt_num
+    if workers is None:
+        workers = dflt_workers
+
+    if workers > 1:
+        yield from gen_3cliques_sharded(source, k=k, p=p, n=n,
+                workers=workers)
+        return
 
     # Build a dict containing all the group_ids as keys, with the corresponding
     # member_id set as the value.
@@ -171,7 +192,7 @@ def gen_3cliques(source, k=None, p=None, n=None):
     if ext == ".json":
         g = GroupsData.from_file(source)
     else:
-        g = GroupsData.from_stash(source)
+        g = GroupsData.from_stash(source, fields=["id"])
 
     node_data = dict()
     for gid in g.get_gids():
@@ -224,7 +245,7 @@ def gen_3cliques(source, k=None, p=None, n=None):
                     min(num_common_12, num_common_13, num_common_23) == 0
                     or max(num_common_123/num_common_12,
                             num_common_123/num_common_13,
-                            num_common_123/num_common_23) < p)
+                            num_common_123/num_common_23) < p
                 ):
                 p_good_to_go = False
         if k_good_to_go or p_good_to_go:
@@ -253,6 +274,323 @@ def gen_3cliques(source, k=None, p=None, n=None):
     print("{} triangles emitted".format(count_tris_emitted))
     print("{} edges emitted".format(count_edges_emitted))
 
+def load_member_sets(source):
+    """
+    Return a GroupMemberSets for all the group_ids in the source (a directory
+    stash, a file with extension .json, or a binary rollup with extension
+    .bin), numbered in sorted gid order.
+    """
+    ext = os.path.splitext(source)[1]
+    if ext == ".json":
+        g = GroupsData.from_file(source)
+    elif ext == ".bin":
+        g = GroupsData.from_binary(source)
+    else:
+        g = GroupsData.from_stash(source, fields=["id"])
+
+    member_sets = g.get_member_sets(gids=sorted(g.get_gids()))
+    print("{} groups".format(len(member_sets)))
+    return member_sets
+
+
+def count_common_table(member_sets, js, within=None):
+    """
+    Return a dense array of the number of members each pair of the groups js
+    of member_sets have in common, only counting the members in within (a
+    sorted array of dense member ids) if given. Entry [x, y] is for js[x]
+    and js[y]. The table is the product of the incidence matrix of the
+    groups (see GroupMemberSets.select()) with its transpose, so the whole
+    table costs a few NumPy and SciPy calls.
+    """
+    indptr, indices, num_columns = member_sets.select(js, within=within)
+    incidence = sp.csr_matrix(
+            (np.ones(len(indices), dtype=np.int32), indices, indptr),
+            shape=(len(indptr) - 1, num_columns))
+    return (incidence @ incidence.T).toarray()
+
+
+def _3cliques_shard(shard):
+    """
+    Return (num_found, triangles) for the triangles (a, b, c) with a in the
+    shard (start, stop) and a < b < c, where triangles is the list of
+    (a, b, c, w_ab, w_ac, w_bc) that pass the k and p tests, in the order
+    combinations() would produce them. The data comes from shared, which the
+    parent process fills in before forking any workers.
+    """
+    start, stop = shard
+    k, p = shared["k"], shared["p"]
+    member_sets = shared["member_sets"]
+    num_nodes = len(member_sets)
+    num_found = 0
+    triangles = []
+    # The members in common are read from tables (see count_common_table()):
+    # shared["num_common"] for the pairs, and for the triples with first
+    # node a the table of the groups after a counting only a's members.
+    num_common = shared["num_common"].tolist()
+    for a in range(start, stop):
+        num_common_1 = num_common[a]
+        num_common_a = count_common_table(member_sets,
+                range(a + 1, num_nodes), within=member_sets.members(a))
+        num_common_a = num_common_a.tolist()
+        for b in range(a + 1, num_nodes):
+            num_common_12 = num_common_1[b]
+            num_common_2 = num_common[b]
+            num_common_3 = num_common_a[b - a - 1]
+            for c in range(b + 1, num_nodes):
+                num_found += 1
+                num_common_13 = num_common_1[c]
+                num_common_23 = num_common_2[c]
+                num_common_123 = num_common_3[c - a - 1]
+                k_good_to_go = True
+                p_good_to_go = True
+                if k:
+                    if num_common_123 < k:
+                        k_good_to_go = False
+                if p:
+                    if (
+                            min(num_common_12, num_common_13,
+                                num_common_23) == 0
+                            or max(num_common_123/num_common_12,
+                                    num_common_123/num_common_13,
+                                    num_common_123/num_common_23) < p
+                        ):
+                        p_good_to_go = False
+                if k_good_to_go or p_good_to_go:
+                    triangles.append((a, b, c,
+                        num_common_12, num_common_13, num_common_23))
+    return num_found, triangles
+
+
+def gen_3cliques_sharded(source, k=None, p=None, n=None, workers=None):
+    """
+    Generate the same edges, in the same order, as gen_3cliques(), but split
+    the first node of each triangle into shards which are processed by a pool
+    of workers. The triangles from each shard are merged back in order, and
+    only then are duplicate edges and the limit n applied, so the output does
+    not depend on the number of workers.
+    """
+
+    if not k and not p:
+        raise RuntimeError("specify k or p, or both!")
+    if k is None:
+        k = dflt_k
+    if p is None:
+        p = dflt_p
+    if n is None:
+        n = dflt_num
+    if workers is None:
+        workers = dflt_workers
+
+    member_sets = load_member_sets(source)
+    node_list = member_sets.gids()
+    shared.update(k=k, p=p, member_sets=member_sets,
+            num_common=count_common_table(member_sets,
+                range(len(node_list))))
+    shards = make_triangle_shards(len(node_list), workers)
+
+    edges = set()
+    count_tris_found, count_tris_emitted, count_edges_emitted = 0, 0, 0
+    try:
+        for num_found, triangles in map_tasks(_3cliques_shard, shards,
+                workers):
+            count_tris_found += num_found
+            for a, b, c, w_ab, w_ac, w_bc in triangles:
+                n1, n2, n3 = node_list[a], node_list[b], node_list[c]
+                count_tris_emitted += 1
+                if (n1, n2) not in edges:
+                    count_edges_emitted += 1
+                    yield str(n1), str(n2), w_ab
+                    edges.add((n1, n2))
+                if (n1, n3) not in edges:
+                    count_edges_emitted += 1
+                    yield str(n1), str(n3), w_ac
+                    edges.add((n1, n3))
+                if (n2, n3) not in edges:
+                    count_edges_emitted += 1
+                    yield str(n2), str(n3), w_bc
+                    edges.add((n2, n3))
+                if count_tris_emitted % 100 == 0:
+                    print(".", end="", flush=True)
+                if count_tris_emitted % 1000 == 0:
+                    print("{}".format(count_tris_emitted), end="", flush=True)
+                if n >= 0 and count_tris_emitted >= n:
+                    break
+            else:
+                continue
+            break
+    finally:
+        shared.clear()
+
+    print()
+    print("{} triangles found".format(count_tris_found))
+    print("{} triangles emitted".format(count_tris_emitted))
+    print("{} edges emitted".format(count_edges_emitted))
+
+def _triangles_shard(shard):
+    """
+    Return (num_found, triangles) for the triangles of the co-membership
+    graph whose lowest node in degree order is in the shard (start, stop) of
+    shared["order"]. Each triangle that passes the k and p tests is returned
+    as (a, b, c, w_ab, w_ac, w_bc) with a < b < c. The data comes from
+    shared, which the parent process fills in before forking any workers.
+    """
+    start, stop = shard
+    k, p = shared["k"], shared["p"]
+    member_sets = shared["member_sets"]
+    order = shared["order"]
+    forward = shared["forward"]
+    weights = shared["weights"]
+    num_found = 0
+    triangles = []
+    for u in order[start:stop]:
+        forward_u = forward[u]
+        if len(forward_u) < 2:
+            continue
+        # The members of u that each pair of its forward neighbors share.
+        neighbors = sorted(forward_u)
+        position = dict((v, x) for x, v in enumerate(neighbors))
+        num_common_u = count_common_table(member_sets, neighbors,
+                within=member_sets.members(u)).tolist()
+        for v in forward_u:
+            num_common_uv = num_common_u[position[v]]
+            for w in forward_u.intersection(forward[v]):
+                num_found += 1
+                num_common_123 = num_common_uv[position[w]]
+                a, b, c = sorted((u, v, w))
+                num_common_12 = weights[a][b]
+                num_common_13 = weights[a][c]
+                num_common_23 = weights[b][c]
+                k_good_to_go = True
+                p_good_to_go = True
+                if k:
+                    if num_common_123 < k:
+                        k_good_to_go = False
+                if p:
+                    if (
+                            min(num_common_12, num_common_13,
+                                num_common_23) == 0
+                            or max(num_common_123/num_common_12,
+                                    num_common_123/num_common_13,
+                                    num_common_123/num_common_23) < p
+                        ):
+                        p_good_to_go = False
+                if k_good_to_go or p_good_to_go:
+                    triangles.append((a, b, c,
+                        num_common_12, num_common_13, num_common_23))
+    return num_found, triangles
+
+
+def gen_3cliques_triangles(source, k=None, p=None, n=None, workers=None):
+    """
+    Generate the same edges, in the same order, as gen_3cliques(), without
+    looking at every triple of groups. Any triangle that passes the k or p
+    test has at least one member common to all three groups, so its three
+    edges are in the co-membership graph (groups joined when they share a
+    member). That graph is built first from a member_id inverted index, and
+    its triangles are enumerated with the forward algorithm: nodes are ranked
+    by degree, and each triangle is found once from its lowest ranked node by
+    intersecting the forward adjacency sets of two of its nodes. Only those
+    triangles get the triple intersection and the k and p tests. The passing
+    triangles are sorted into combinations() order before the edges are
+    emitted. The cost depends on the number of edges and triangles rather
+    than on the cube of the number of groups.
+    """
+
+    if not k and not p:
+        raise RuntimeError("specify k or p, or both!")
+    if k is None:
+        k = dflt_k
+    if p is None:
+        p = dflt_p
+    if n is None:
+        n = dflt_num
+    if workers is None:
+        workers = dflt_workers
+
+    # With k <= 0 or p <= 0 triangles with no members common to all three
+    # groups can pass the test. Those need not be triangles of the
+    # co-membership graph, so fall back to visiting every triple.
+
+    if k <= 0 or p <= 0:
+        yield from gen_3cliques(source, k=k, p=p, n=n, workers=workers)
+        return
+
+    member_sets = load_member_sets(source)
+    node_list = member_sets.gids()
+
+    # Build the co-membership graph: weights[a][b] is the number of members
+    # groups a and b have in common, for every pair with at least one.
+
+    member_groups = [[] for _ in range(member_sets.num_members())]
+    for a in range(len(node_list)):
+        for member_id in member_sets.members(a).tolist():
+            member_groups[member_id].append(a)
+    weights = [defaultdict(int) for _ in node_list]
+    for groups in member_groups:
+        for i, a in enumerate(groups):
+            weights_a = weights[a]
+            for b in groups[i + 1:]:
+                weights_a[b] += 1
+    del member_groups
+    for a, weights_a in enumerate(weights):
+        for b, w in list(weights_a.items()):
+            weights[b][a] = w
+    num_edges = sum(len(weights_a) for weights_a in weights) // 2
+    print("{} co-membership edges".format(num_edges))
+
+    # Rank the nodes by degree (ties by node number). The forward adjacency
+    # set of a node holds its neighbors of higher rank.
+
+    order = sorted(range(len(node_list)), key=lambda a: (len(weights[a]), a))
+    rank = [0] * len(node_list)
+    for r, a in enumerate(order):
+        rank[a] = r
+    forward = [set(b for b in weights[a] if rank[b] > rank[a])
+            for a in range(len(node_list))]
+
+    shared.update(k=k, p=p, member_sets=member_sets, order=order,
+            forward=forward, weights=weights)
+    shards = make_shards(len(order), workers)
+    count_tris_found = 0
+    all_triangles = []
+    try:
+        for num_found, triangles in map_tasks(_triangles_shard, shards,
+                workers):
+            count_tris_found += num_found
+            all_triangles.extend(triangles)
+    finally:
+        shared.clear()
+    all_triangles.sort()
+
+    edges = set()
+    count_tris_emitted, count_edges_emitted = 0, 0
+    for a, b, c, w_ab, w_ac, w_bc in all_triangles:
+        n1, n2, n3 = node_list[a], node_list[b], node_list[c]
+        count_tris_emitted += 1
+        if (n1, n2) not in edges:
+            count_edges_emitted += 1
+            yield str(n1), str(n2), w_ab
+            edges.add((n1, n2))
+        if (n1, n3) not in edges:
+            count_edges_emitted += 1
+            yield str(n1), str(n3), w_ac
+            edges.add((n1, n3))
+        if (n2, n3) not in edges:
+            count_edges_emitted += 1
+            yield str(n2), str(n3), w_bc
+            edges.add((n2, n3))
+        if count_tris_emitted % 100 == 0:
+            print(".", end="", flush=True)
+        if count_tris_emitted % 1000 == 0:
+            print("{}".format(count_tris_emitted), end="", flush=True)
+        if n >= 0 and count_tris_emitted >= n:
+            break
+
+    print()
+    print("{} triangles found".format(count_tris_found))
+    print("{} triangles emitted".format(count_tris_emitted))
+    print("{} edges emitted".format(count_edges_emitted))
+
 @click.command()
 @click.option("-k", type=int,
         help=("Two groups must have at least k members in common to have"
@@ -270,9 +608,16 @@ def gen_3cliques(source, k=None, p=None, n=None):
         help="Seed for random number generator.")
 @click.option("--max-null", default=dflt_max_null_passes,
         help="Stop if no random edge after this many trys.")
-@click.argument('source', "source", type=click.Path())
+@click.option("--engine", type=click.Choice(engines), default=dflt_engine,
+        help=("How to find triangles: triangles (enumerate the triangles of"
+            " the co-membership graph) or combinations (check every triple"
+            " of groups; slow, for checking)."))
+@click.option("--workers", default=dflt_workers,
+        help="Number of worker processes (not for --random-sample).")
+@click.argument('source', type=click.Path())
 @click.argument('ncol-file', type=click.Path())
-def go(k, p, n, random_sample, seed, max_null, source, ncol_file):
+def go(k, p, n, random_sample, seed, max_null, engine, workers, source,
+        ncol_file):
     """
     Walk the directory tree starting at stash-root, read each group-member
     JSON file found, generate the group graph, and finally write the weighted
@@ -284,6 +629,9 @@ def go(k, p, n, random_sample, seed, max_null, source, ncol_file):
         node1 node2 weight
         node3 node4 weight
         ...
+
+    If ncol-file has the extension .bin, the edges are written in the
+    binary edge format instead (see GroupGraphBinary).
     """
     print("source: {!r}".format(source))
     print("random-sample: {}".format(random_sample))
@@ -292,10 +640,17 @@ def go(k, p, n, random_sample, seed, max_null, source, ncol_file):
     print("n: {}".format(n))
     print("max-null: {}".format(max_null))
     print("seed: {}".format(seed))
+    print("engine: {}".format(engine))
+    print("workers: {}".format(workers))
     if random_sample:
         gen = partial(gen_random_3cliques, seed=seed, max_null_passes=max_null)
+    elif engine == "combinations":
+        gen = partial(gen_3cliques, workers=workers)
     else:
-        gen = partial(gen_3cliques)
+        gen = partial(gen_3cliques_triangles, workers=workers)
+    if os.path.splitext(ncol_file)[1] == ".bin":
+        GroupGraphGen(gen(source, k=k, p=p, n=n)).write_binary(ncol_file)
+        return
     with click.open_file(ncol_file, "w") as ofp:
         for n1, n2, w in gen(source, k=k, p=p, n=n):
             print("{} {} {}".format(n1, n2, w), file=ofp)
@@ -1,19 +1,30 @@
 #!/usr/bin/env python3
 
+from collections import defaultdict
 from functools import partial
 import click
 import inspect
+import numpy as np
 from pprint import pformat
 import os
 import random
+import scipy.sparse as sp
 import sys
+from groupgraph import GroupGraphGen
 from meetupdata import GroupsData
+from workerpool import make_shards
+from workerpool import map_tasks
+from workerpool import shared
 
 dflt_seed = None
 dflt_k = 1      # Number of members two groups must have in common.
 dflt_p = 0.05   # Percent membership each of two groups must share.
 dflt_num = 100  # Number of edges to generate.
 dflt_max_null_passes=10000  # Stop if no random edge after this many trys.
+dflt_block_rows = 1024  # Groups per block of the sparse matrix product.
+dflt_engine = "index"
+engines = ["index", "sparse", "pairwise"]
+dflt_workers = 1    # Number of worker processes for the index engine.
 
 
 def gen_random_edges_common_members(source, k=None, p=None, n=None, seed=None,
@@ -124,24 +135,11 @@ def gen_edges_common_members(source, k=None, p=None, n=None):
     #print("{}: n={}".format(inspect.currentframe().f_code.co_name, n))
 
     # Build a dict containing all the group_ids as keys, with the corresponding
-    # member_id set as the value.
+    # member_id list as the value. This engine intersects the member_id sets
+    # directly, without GroupMemberSets or an index, so it stays a reference
+    # for the other engines.
 
-    ext = os.path.splitext(source)[1]
-    if ext == ".json":
-        g = GroupsData.from_file(source, fields=["id", "members"])
-    else:
-        g = GroupsData.from_stash(source, fields=["id"])
-
-    node_data = dict()
-    for gid in g.get_gids():
-        gdata = g.lookup_gid(gid)
-        try:
-            node_data[gid] = gdata["members"]
-        except KeyError as exc:
-            print("KeyError: {}".format(exc))
-            print("gdata: {}".format(gdata))
-            raise
-    print("{} groups".format(len(node_data)))
+    node_data = load_node_data(source)
 
     # The nodes of the graph are the group_ids. Two nodes are connected with an
     # edge if they have at least k member_ids in common. Generate all unique
@@ -189,6 +187,262 @@ def gen_edges_common_members(source, k=None, p=None, n=None):
     print("{} edges".format(num_emitted))
 
 
+def load_node_data(source):
+    """
+    Return a dict containing all the group_ids in the source (a directory
+    stash, a file with extension .json, or a binary rollup with extension
+    .bin) as keys, with the corresponding list
+    of member_ids as the value.
+    """
+    ext = os.path.splitext(source)[1]
+    if ext == ".json":
+        g = GroupsData.from_file(source, fields=["id", "members"])
+    elif ext == ".bin":
+        g = GroupsData.from_binary(source, fields=["id", "members"])
+    else:
+        g = GroupsData.from_stash(source, fields=["id"])
+
+    node_data = dict()
+    for gid in g.get_gids():
+        gdata = g.lookup_gid(gid)
+        try:
+            node_data[gid] = gdata["members"]
+        except KeyError as exc:
+            print("KeyError: {}".format(exc))
+            print("gdata: {}".format(gdata))
+            raise
+    print("{} groups".format(len(node_data)))
+    return node_data
+
+
+def _common_members_rows(shard):
+    """
+    Return the edges (i, j, num_common) that pass the k and p tests for the
+    groups i in the shard (start, stop) of the node list. The data comes from
+    shared, which the parent process fills in before forking any workers so
+    that they all read the same copy-on-write pages.
+    """
+    start, stop = shard
+    k, p = shared["k"], shared["p"]
+    member_sets = shared["member_sets"]
+    member_groups = shared["member_groups"]
+    rank = shared["rank"]
+    edges = []
+    for i in range(start, stop):
+        rank_n1 = rank[i]
+        common_counts = defaultdict(int)
+        for member_id in member_sets[i]:
+            for j in member_groups[member_id]:
+                if rank[j] > rank_n1:
+                    common_counts[j] += 1
+        num_n1 = len(member_sets[i])
+        for j in sorted(common_counts):
+            num_common = common_counts[j]
+            num_n2 = len(member_sets[j])
+            k_good_to_go = num_common >= k
+            p_good_to_go = not (
+                    (num_n1 == 0 or num_n2 == 0)
+                    or ((num_common / num_n1) < p and (num_common / num_n2) < p)
+                    )
+            if k_good_to_go or p_good_to_go:
+                edges.append((i, j, num_common))
+    return edges
+
+
+def load_member_sets(source):
+    """
+    Return a GroupMemberSets for all the group_ids in the source (a directory
+    stash, a file with extension .json, or a binary rollup with extension
+    .bin).
+    """
+    ext = os.path.splitext(source)[1]
+    if ext == ".json":
+        g = GroupsData.from_file(source, fields=["id", "members"])
+    elif ext == ".bin":
+        g = GroupsData.from_binary(source, fields=["id", "members"])
+    else:
+        g = GroupsData.from_stash(source, fields=["id"])
+
+    member_sets = g.get_member_sets()
+    print("{} groups".format(len(member_sets)))
+    return member_sets
+
+
+def gen_edges_common_members_indexed(source, k=None, p=None, n=None,
+        workers=None):
+    """
+    Generate at most n edges of the group graph from JSON data stored in a
+    directory stash or a file (source extension .json). Produces the same
+    edges, in the same order, as gen_edges_common_members(), but instead of
+    intersecting the member sets of every pair of groups it first builds an
+    inverted index from member_id to the groups that member belongs to, then
+    counts the members in common by walking each member's group list. The
+    cost is proportional to the number of shared memberships rather than to
+    the square of the number of groups.
+
+    With workers > 1 the groups are split into shards which are processed by
+    a pool of worker processes. The shards are merged back in order, so the
+    output does not depend on the number of workers.
+    """
+
+    if not k and not p:
+        raise RuntimeError("specify k or p, or both!")
+    if k is None:
+        k = dflt_k
+    if p is None:
+        p = dflt_p
+    if n is None:
+        n = dflt_num
+    if workers is None:
+        workers = dflt_workers
+
+    # With k <= 0 or p <= 0 every pair of groups passes the test, including
+    # pairs with no members in common, which the inverted index never sees.
+    # Fall back to visiting every pair.
+
+    if k <= 0 or p <= 0:
+        yield from gen_edges_common_members(source, k=k, p=p, n=n)
+        return
+
+    node_data = load_node_data(source)
+
+    # Number the groups in the order gen_edges_common_members() visits them,
+    # and rank them by gid so the "n1 < n2" test is an integer comparison.
+    # The inverted index maps each member_id to the list of group numbers
+    # that member belongs to.
+
+    node_list = list(node_data)
+    member_sets = [set(node_data[gid]) for gid in node_list]
+    del node_data
+    rank = [0] * len(node_list)
+    for r, i in enumerate(sorted(range(len(node_list)),
+            key=lambda i: node_list[i])):
+        rank[i] = r
+    member_groups = defaultdict(list)
+    for i, members in enumerate(member_sets):
+        for member_id in members:
+            member_groups[member_id].append(i)
+    print("{} members".format(len(member_groups)))
+
+    # For each group n1, count the members it has in common with every group
+    # n2 > n1 that shares at least one member with it, then apply the k and p
+    # tests to those candidates in the same order as the pairwise loop.
+
+    shared.update(k=k, p=p, member_sets=member_sets,
+            member_groups=member_groups, rank=rank)
+    shards = make_shards(len(node_list), workers)
+    num_emitted = 0
+    try:
+        for edges in map_tasks(_common_members_rows, shards, workers):
+            for i, j, num_common in edges:
+                yield str(node_list[i]), str(node_list[j]), num_common
+                num_emitted += 1
+                if num_emitted % 100 == 0:
+                    print(".", end="", flush=True)
+                if num_emitted % 1000 == 0:
+                    print("{}".format(num_emitted), end="", flush=True)
+                if n >= 0 and num_emitted >= n:
+                    break
+            else:
+                continue
+            break
+    finally:
+        shared.clear()
+    print("{} edges".format(num_emitted))
+
+
+def gen_edges_common_members_sparse(source, k=None, p=None, n=None,
+        block_rows=None):
+    """
+    Generate at most n edges of the group graph from JSON data stored in a
+    directory stash or a file (source extension .json). Produces the same
+    edges, in the same order, as gen_edges_common_members(), using a sparse
+    group x member incidence matrix A. The number of members in common for
+    every pair of groups is the matrix product A * A.T, which is computed
+    block_rows groups at a time so that memory use stays bounded. The k and
+    p tests are applied to each block as array masks.
+    """
+
+    if not k and not p:
+        raise RuntimeError("specify k or p, or both!")
+    if k is None:
+        k = dflt_k
+    if p is None:
+        p = dflt_p
+    if n is None:
+        n = dflt_num
+    if block_rows is None:
+        block_rows = dflt_block_rows
+
+    # With k <= 0 or p <= 0 every pair of groups passes the test, including
+    # pairs with no members in common, which the sparse product never sees.
+    # Fall back to visiting every pair.
+
+    if k <= 0 or p <= 0:
+        yield from gen_edges_common_members(source, k=k, p=p, n=n)
+        return
+
+    member_sets = load_member_sets(source)
+
+    # Number the groups in the order gen_edges_common_members() visits them,
+    # and rank them by gid so the "n1 < n2" test is an integer comparison.
+    # Each distinct member_id gets a column of the incidence matrix.
+
+    node_list = member_sets.gids()
+    num_nodes = len(node_list)
+    rank = np.empty(num_nodes, dtype=np.int64)
+    rank[sorted(range(num_nodes), key=lambda i: node_list[i])] = np.arange(
+            num_nodes)
+    num_members = member_sets.num_members()
+    print("{} members".format(num_members))
+    offsets, members = member_sets.csr_arrays()
+    incidence = sp.csr_matrix(
+            (np.ones(len(members), dtype=np.int32), members, offsets),
+            shape=(num_nodes, num_members))
+    incidence_t = incidence.T.tocsc()
+    group_sizes = member_sets.sizes()
+
+    # For each block of rows, the product holds the members in common between
+    # the groups of the block and every other group. Keep only n2 > n1, then
+    # apply the k and p tests to all the entries of the block at once.
+
+    num_emitted = 0
+    for start in range(0, num_nodes, block_rows):
+        stop = min(start + block_rows, num_nodes)
+        common = (incidence[start:stop] * incidence_t).tocoo()
+        rows = common.row.astype(np.int64) + start
+        cols = common.col.astype(np.int64)
+        num_common = common.data
+        keep = rank[cols] > rank[rows]
+        rows, cols, num_common = rows[keep], cols[keep], num_common[keep]
+        order = np.lexsort((cols, rows))
+        rows, cols, num_common = rows[order], cols[order], num_common[order]
+        num_n1 = group_sizes[rows]
+        num_n2 = group_sizes[cols]
+        k_good_to_go = num_common >= k
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p_good_to_go = ~(
+                    (num_n1 == 0) | (num_n2 == 0)
+                    | (((num_common / num_n1) < p)
+                        & ((num_common / num_n2) < p))
+                    )
+        good = k_good_to_go | p_good_to_go
+        for i, j, w in zip(rows[good].tolist(), cols[good].tolist(),
+                num_common[good].tolist()):
+            yield str(node_list[i]), str(node_list[j]), w
+            num_emitted += 1
+            if num_emitted % 100 == 0:
+                print(".", end="", flush=True)
+            if num_emitted % 1000 == 0:
+                print("{}".format(num_emitted), end="", flush=True)
+            if n >= 0 and num_emitted >= n:
+                break
+        else:
+            continue
+        break
+    print("{} edges".format(num_emitted))
+
+
 @click.command()
 @click.option("-k", type=int,
         help=("Two groups must have at least k members in common to have"
@@ -206,9 +460,19 @@ def gen_edges_common_members(source, k=None, p=None, n=None):
         help="Seed for random number generator.")
 @click.option("--max-null", default=dflt_max_null_passes,
         help="Stop if no random edge after this many trys.")
+@click.option("--engine", type=click.Choice(engines), default=dflt_engine,
+        help=("How to count members in common: index (member_id inverted"
+            " index), sparse (blocked sparse matrix product), or pairwise"
+            " (compare every pair of groups; slow, for checking)."))
+@click.option("--block-rows", type=click.IntRange(min=1),
+        default=dflt_block_rows,
+        help="Groups per block of the sparse matrix product.")
+@click.option("--workers", default=dflt_workers,
+        help="Number of worker processes (index engine only).")
 @click.argument('source', type=click.Path())
 @click.argument('ncol-file', type=click.Path())
-def go(k, p, n, random_sample, seed, max_null, source, ncol_file):
+def go(k, p, n, random_sample, seed, max_null, engine, block_rows, workers,
+        source, ncol_file):
     """
     Generate the group graph from the source (either a directory stash or a
     file of JSON group objects), and finally write the weighted edges of to
@@ -220,6 +484,9 @@ def go(k, p, n, random_sample, seed, max_null, source, ncol_file):
         node1 node2 weight
         node3 node4 weight
         ...
+
+    If ncol-file has the extension .bin, the edges are written in the
+    binary edge format instead (see GroupGraphBinary).
     """
     print("source: {!r}".format(source))
     print("random_dample: {}".format(random_sample))
@@ -228,11 +495,23 @@ def go(k, p, n, random_sample, seed, max_null, source, ncol_file):
     print("n: {}".format(n))
     print("max-null: {}".format(max_null))
     print("seed: {}".format(seed))
+    print("engine: {}".format(engine))
+    print("workers: {}".format(workers))
+    if workers > 1 and (random_sample or engine != "index"):
+        raise click.BadParameter("only the index engine supports workers",
+                param_hint="--workers")
     if random_sample:
         gen = partial(gen_random_edges_common_members, seed=seed,
                 max_null_passes=max_null)
-    else:
+    elif engine == "pairwise":
         gen = partial(gen_edges_common_members)
+    elif engine == "sparse":
+        gen = partial(gen_edges_common_members_sparse, block_rows=block_rows)
+    else:
+        gen = partial(gen_edges_common_members_indexed, workers=workers)
+    if os.path.splitext(ncol_file)[1] == ".bin":
+        GroupGraphGen(gen(source, k=k, p=p, n=n)).write_binary(ncol_file)
+        return
     with click.open_file(ncol_file, "w") as ofp:
         for n1, n2, w in gen(source, k=k, p=p, n=n):
             print("{} {} {}".format(n1, n2, w), file=ofp)
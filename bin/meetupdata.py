@@ -1,8 +1,27 @@
 #!/usr/bin/env python3
 
+from collections import namedtuple
+import functools
+import gzip
+import io
 import json
+import lzma
+import mmap
+import multiprocessing
+import numpy as np
 import os
+import re
+import sqlite3
+import struct
 import sys
+import time
+import traceback
+import urllib.parse
+import zipfile
+
+dflt_queue_size = 1000  # Groups buffered between ingest workers and writer.
+dflt_cache_size = 1024  # Records kept by a lazy GroupsFileData.
+dflt_sql_batch = 500  # Host parameters per query in GroupGidDb.get_many().
 
 
 class GroupGidMap:
@@ -18,17 +37,24 @@ class GroupGidMap:
         self._group_gid_map = map
 
     @classmethod
-    def from_file(cls, groups_file):
+    def from_file(cls, groups_file, lazy=False):
         """
-        A groups file can be either a plain text file (xxx.txt) or a file
-        of JSON objects (xxx.json). This classmethod determines which to
-        use based on file extension and uses the appropriate loader.
+        A groups file can be either a plain text file (xxx.txt), a file
+        of JSON objects (xxx.json) or a SQLite database written by
+        write_db() (xxx.db). This classmethod determines which to use based
+        on file extension and uses the appropriate loader. For a database
+        a GroupGidDb is returned, which reads nothing up front, and so is a
+        GroupGidJson for a JSON file with lazy=True.
         """
         ext = os.path.splitext(groups_file)[1]
         if ext == ".txt":
             return cls(map=cls._load_txt(groups_file))
         if ext == ".json":
+            if lazy:
+                return GroupGidJson(groups_file)
             return cls(map=cls._load_json(groups_file))
+        if ext == ".db":
+            return GroupGidDb(groups_file)
 
     @staticmethod
     def _load_txt(fpath):
@@ -101,18 +127,524 @@ class GroupGidMap:
         return iter(self._group_gid_map)
 
     def __contains__(self, item):
-        return item in self.group_id_map
+        return item in self._group_gid_map
+
+    def get_many(self, gids, keys=None):
+        """
+        Return a dict of gid to a dict of the values of keys (default
+        ["name"]) for each of gids that is in the map.
+        """
+        if keys is None:
+            keys = ["name"]
+        values = dict()
+        for gid in gids:
+            group = self._group_gid_map.get(gid, None)
+            if group is not None:
+                values[gid] = {key: group.get(key, None) for key in keys}
+        return values
+
+    def write_db(self, fpath):
+        """
+        Write the map to a SQLite database at fpath, indexed on gid and
+        name, which GroupGidMap.from_file() opens as a GroupGidDb.
+        """
+        tmp_fpath = fpath + ".tmp"
+        if os.path.exists(tmp_fpath):
+            os.remove(tmp_fpath)
+        conn = sqlite3.connect(tmp_fpath)
+        try:
+            conn.execute("CREATE TABLE groups (gid TEXT PRIMARY KEY,"
+                    " name TEXT, members INTEGER, description TEXT)")
+            conn.executemany("INSERT INTO groups VALUES (?, ?, ?, ?)",
+                    ((gid, group.get("name"), group.get("members"),
+                        group.get("description"))
+                        for gid, group in self._group_gid_map.items()))
+            conn.execute("CREATE INDEX groups_name ON groups (name)")
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_fpath, fpath)
+
+
+class GroupGidDb(GroupGidMap):
+    """
+    Class for a GroupGidMap kept in a SQLite database written by
+    GroupGidMap.write_db(). Groups are queried as needed instead of being
+    loaded, and get_many() resolves a batch of gids with a few queries.
+    The database is opened read-only, so a missing one is an error rather
+    than an empty database created in its place.
+    """
+
+    keys = ["name", "members", "description"]
+
+    def __init__(self, fpath):
+        """
+        The class constructor is not typically invoked directly. Use
+        GroupGidMap.from_file().
+        """
+        self._fpath = fpath
+        self._conn = sqlite3.connect("file:{}?mode=ro".format(
+            urllib.parse.quote(fpath)), uri=True)
+
+    def get(self, gid, key):
+        """
+        Return the value of key for gid.
+        """
+        return self.get_many([gid], keys=[key]).get(gid, {}).get(key, None)
+
+    def get_many(self, gids, keys=None):
+        """
+        Return a dict of gid to a dict of the values of keys (default
+        ["name"]) for each of gids that is in the database. Keys that are
+        not columns of the database have the value None.
+        """
+        if keys is None:
+            keys = ["name"]
+        columns = [key for key in keys if key in self.keys]
+        select = ", ".join(["gid"] + columns)
+        gids = list(gids)
+        values = dict()
+        for start in range(0, len(gids), dflt_sql_batch):
+            batch = gids[start:start + dflt_sql_batch]
+            query = "SELECT {} FROM groups WHERE gid IN ({})".format(
+                    select, ", ".join("?" * len(batch)))
+            for row in self._conn.execute(query, batch):
+                group = dict(zip(columns, row[1:]))
+                values[row[0]] = {key: group.get(key, None) for key in keys}
+        return values
+
+    def __getitem__(self, gid):
+        """
+        By default, return the "name" field when accessed with x[gid]. To
+        access some other field, use the get() method.
+        """
+        row = self._conn.execute("SELECT name FROM groups WHERE gid = ?",
+                (gid,)).fetchone()
+        if row is None:
+            raise KeyError(gid)
+        return row[0]
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM groups").fetchone()[0]
+
+    def __iter__(self):
+        return (row[0] for row in self._conn.execute("SELECT gid FROM groups"))
+
+    def __contains__(self, item):
+        return self._conn.execute("SELECT 1 FROM groups WHERE gid = ?",
+                (item,)).fetchone() is not None
+
+    def write_db(self, fpath):
+        """
+        Copy the database to fpath. There is nothing to do if fpath is the
+        database itself.
+        """
+        if os.path.exists(fpath) and os.path.samefile(fpath, self._fpath):
+            return
+        tmp_fpath = fpath + ".tmp"
+        if os.path.exists(tmp_fpath):
+            os.remove(tmp_fpath)
+        conn = sqlite3.connect(tmp_fpath)
+        try:
+            self._conn.backup(conn)
+        finally:
+            conn.close()
+        os.replace(tmp_fpath, fpath)
+
+
+class GroupGidJson(GroupGidMap):
+    """
+    Class for a GroupGidMap kept in a file of JSON objects, read through a
+    lazy GroupsFileData: only the offset index of the file is loaded, and
+    the records of the gids looked up are read and decoded as needed. This
+    suits a few lookups in a large file.
+    """
+
+    keys = ["name", "members", "description"]
+
+    def __init__(self, fpath):
+        """
+        The class constructor is not typically invoked directly. Use
+        GroupGidMap.from_file().
+        """
+        self._fpath = fpath
+        self._groups_data = GroupsFileData(fpath, lazy=True)
+
+    def _group(self, gid):
+        """
+        Return the dict of the keys of gid, as _load_json() makes it, or
+        None if gid is not in the file.
+        """
+        if gid not in self._groups_data:
+            return None
+        envelope = self._groups_data.lookup_gid(gid)
+        return dict(name=envelope["name"], members=envelope["members"],
+                description=envelope.get("description", "<none>"))
+
+    def get(self, gid, key):
+        """
+        Return the value of key for gid.
+        """
+        group = self._group(gid)
+        if group is None:
+            return None
+        return group.get(key, None)
+
+    def get_many(self, gids, keys=None):
+        """
+        Return a dict of gid to a dict of the values of keys (default
+        ["name"]) for each of gids that is in the file.
+        """
+        if keys is None:
+            keys = ["name"]
+        values = dict()
+        for gid in gids:
+            group = self._group(gid)
+            if group is not None:
+                values[gid] = {key: group.get(key, None) for key in keys}
+        return values
+
+    def __getitem__(self, gid):
+        """
+        By default, return the "name" field when accessed with x[gid]. To
+        access some other field, use the get() method.
+        """
+        group = self._group(gid)
+        if group is None:
+            raise KeyError(gid)
+        return group["name"]
+
+    def __len__(self):
+        return len(self._groups_data.get_gids())
+
+    def __iter__(self):
+        return iter(self._groups_data.get_gids())
+
+    def __contains__(self, item):
+        return item in self._groups_data
+
+    def close(self):
+        self._groups_data.close()
+
+    def write_db(self, fpath):
+        """
+        Write the map to a SQLite database at fpath, as GroupGidMap does,
+        which needs all of the file.
+        """
+        GroupGidMap.from_file(self._fpath).write_db(fpath)
+
+
+class StashRecordDecoder:
+    """
+    Class to decode some fields of the member in stash records.
+
+    A stash record is a whole member envelope (photo links, topics, other
+    services, ...), but callers usually only want the member "id", which the
+    Meetup API puts near the start of the member. The fast path matches each
+    field with a regex anchored at the start of the record which only steps
+    over simple "key": value pairs, so a match is always a key of the member
+    object itself, and decodes just that value. If a field is not a simple
+    value, or comes after a nested object or list, the record is decoded
+    with json.loads().
+    """
+
+    _scalar = (r'"(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?'
+            r'|true|false|null')
+    _pair = r'"(?:[^"\\]|\\.)*": (?:{}), '.format(_scalar)
+
+    def __init__(self, fields, fast=True):
+        self._fields = fields
+        self._fast = fast
+        self._field_res = [re.compile(
+                r'\{{(?:{pair})*?"member": \{{(?:{pair})*?"{field}": ({scalar})'
+                r'[,}}]'.format(pair=self._pair, field=re.escape(f),
+                    scalar=self._scalar))
+                for f in fields]
+        self.num_fast = 0
+        self.num_slow = 0
+
+    def decode(self, line):
+        """
+        Return a tuple of the values of the fields of the member in the stash
+        record line.
+        """
+        values = self._decode_fast(line) if self._fast else None
+        if values is None:
+            self.num_slow += 1
+            envelope_member = json.loads(line)["member"]
+            values = tuple(envelope_member[f] for f in self._fields)
+        else:
+            self.num_fast += 1
+        return values
+
+    def _decode_fast(self, line):
+        """
+        Return a tuple of the values of the fields, or None if they cannot be
+        found without decoding the whole record.
+        """
+        values = []
+        for field_re in self._field_res:
+            match = field_re.match(line)
+            if match is None:
+                return None
+            token = match.group(1)
+            if token.isdigit():
+                values.append(int(token))
+            else:
+                values.append(json.loads(token))
+        return tuple(values)
+
+
+stash_file_exts = [".json", ".json.gz", ".json.xz"]
+stash_archive_ext = ".zip"
+
+
+def stash_gid(fname):
+    """
+    Return the gid of a stash group file name such as "1234.json.gz".
+    """
+    return fname.split(".", 1)[0]
+
+
+def open_stash_file(fpath, mode="rt"):
+    """
+    Open a stash group file, decompressing it on the fly if it ends in .gz
+    or .xz.
+    """
+    if fpath.endswith(".gz"):
+        return gzip.open(fpath, mode)
+    if fpath.endswith(".xz"):
+        return lzma.open(fpath, mode)
+    return open(fpath, mode)
+
+
+def stash_shards(stash_root):
+    """
+    Return the sorted list of shards of the stash at stash_root: the
+    level_1/level_2 subdirectories, and the level_1/level_2.zip archives
+    that pack the group files of a subdirectory into one file.
+    """
+    shards = []
+    for level_1 in sorted(os.listdir(stash_root)):
+        level_1_dir = os.path.join(stash_root, level_1)
+        if not os.path.isdir(level_1_dir):
+            continue
+        for level_2 in sorted(os.listdir(level_1_dir)):
+            shard = os.path.join(level_1_dir, level_2)
+            if os.path.isdir(shard) or level_2.endswith(stash_archive_ext):
+                shards.append(shard)
+    return shards
+
+
+def stash_listing(stash_root):
+    """
+    Return a dict of gid to (path, size, mtime) for the group files in the
+    stash at stash_root, as recorded in its manifest (see StashManifest),
+    from a listing of the shards without reading the files: the stat of a
+    file in a shard directory, or the entry of an archive member. A group
+    file in a shard directory wins over one for the same gid in the shard's
+    archive, as it was installed after the shard was packed.
+    """
+    listing = dict()
+    archived = dict()
+    for shard in stash_shards(stash_root):
+        rel_shard = os.path.relpath(shard, stash_root)
+        if shard.endswith(stash_archive_ext):
+            with zipfile.ZipFile(shard) as archive:
+                for info in archive.infolist():
+                    mtime = time.mktime(info.date_time + (0, 0, -1))
+                    archived[stash_gid(info.filename)] = (
+                            "{}:{}".format(rel_shard, info.filename),
+                            info.compress_size, int(mtime))
+            continue
+        for fname in os.listdir(shard):
+            st = os.stat(os.path.join(shard, fname))
+            listing[stash_gid(fname)] = (os.path.join(rel_shard, fname),
+                    st.st_size, int(st.st_mtime))
+    for gid, item in archived.items():
+        listing.setdefault(gid, item)
+    return listing
+
+
+class StashManifest:
+    """
+    Class for the manifest of a stash, which records for each group file the
+    fields gid, path (relative to the stash root), size, mtime (whole
+    seconds) and the number of members (lines), separated by tabs::
+
+        26434\t2/6/26434.json\t1234567\t1449776819\t1650
+        ...
+
+    "stash.sh install" appends a line for each file it installs, so a later
+    line for a gid replaces an earlier one. Before its first append to a
+    stash that has no manifest, it writes the lines of the group files
+    already there, so the manifest lists the whole stash and is trusted as
+    it is. After the stash was changed by other means, reconcile() brings it
+    back in line (reduce-stash.py --rescan). The manifest of a stash lives
+    next to it (see path_for()). A copy of it is saved next to each rollup
+    made from the stash (see path_for_rollup()), which tells what the rollup
+    contains without reading it.
+    """
+
+    Entry = namedtuple("Entry", "gid path size mtime num_members")
+
+    def __init__(self, entries):
+        """
+        The class constructor is not typically invoked directly. Use one
+        of the from_xxx classmethods below.
+        """
+        self._entries = entries
+
+    @staticmethod
+    def path_for(stash_root):
+        """
+        Return the path of the manifest of the stash at stash_root.
+        """
+        return stash_root.rstrip(os.sep) + ".manifest"
+
+    @staticmethod
+    def path_for_rollup(rollup_fpath):
+        """
+        Return the path of the manifest saved next to a rollup file.
+        """
+        return rollup_fpath + ".manifest"
+
+    @classmethod
+    def from_file(cls, fpath):
+        """
+        Load a manifest file.
+        """
+        entries = dict()
+        with open(fpath) as mfp:
+            for line in mfp:
+                line = line.rstrip("\n")
+                if not line:
+                    continue
+                gid, path, size, mtime, num_members = line.split("\t")
+                entries[gid] = cls.Entry(gid, path, int(size), int(mtime),
+                        int(num_members))
+        return cls(entries)
+
+    @classmethod
+    def from_stash(cls, stash_root, gids=None, listing=None):
+        """
+        Build the manifest of the stash at stash_root by walking it, or only
+        the entries of the set of gids, reading each group file to count its
+        members. listing is the stash_listing() of the stash, if already
+        made.
+        """
+        if listing is None:
+            listing = stash_listing(stash_root)
+        entries = dict()
+        archives = dict()
+        try:
+            for gid, (path, size, mtime) in listing.items():
+                if gids is not None and gid not in gids:
+                    continue
+                rel_shard, sep, fname = path.partition(":")
+                if sep:
+                    archive = archives.get(rel_shard)
+                    if archive is None:
+                        archive = zipfile.ZipFile(os.path.join(stash_root,
+                            rel_shard))
+                        archives[rel_shard] = archive
+                    num_members = archive.read(fname).count(b"\n")
+                else:
+                    with open_stash_file(os.path.join(stash_root, path),
+                            "rb") as gfp:
+                        num_members = gfp.read().count(b"\n")
+                entries[gid] = cls.Entry(gid, path, size, mtime, num_members)
+        finally:
+            for archive in archives.values():
+                archive.close()
+        return cls(entries)
+
+    def reconcile(self, stash_root):
+        """
+        Bring the manifest in line with the stash at stash_root, from a
+        listing of it (see stash_listing()): read the group files that are
+        new, or whose path, size or mtime changed, and drop the entries of
+        the gids no longer in the stash. Return True if the manifest
+        changed.
+        """
+        listing = stash_listing(stash_root)
+        stale = set(gid for gid, item in listing.items()
+                if gid not in self._entries
+                    or tuple(self._entries[gid][1:4]) != item)
+        removed = set(self._entries) - set(listing)
+        if stale:
+            self._entries.update(StashManifest.from_stash(stash_root,
+                gids=stale, listing=listing)._entries)
+        for gid in removed:
+            del self._entries[gid]
+        return bool(stale or removed)
+
+    def write(self, fpath):
+        """
+        Write the manifest to fpath, in gid order.
+        """
+        tmp_fpath = fpath + ".tmp"
+        with open(tmp_fpath, "w") as mfp:
+            for gid in sorted(self._entries):
+                print("\t".join(str(_) for _ in self._entries[gid]),
+                        file=mfp)
+        os.replace(tmp_fpath, fpath)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, gid):
+        return gid in self._entries
+
+    def get(self, gid):
+        """
+        Return the Entry for gid, or None.
+        """
+        return self._entries.get(gid)
+
+    def get_gids(self):
+        """
+        Return the list of gids.
+        """
+        return list(self._entries)
+
+    def diff(self, other):
+        """
+        Compare with an older manifest. Return (changed, removed), the sets
+        of gids that are new or whose file changed size or mtime since
+        other, and of gids that are in other but no longer here.
+        """
+        changed = set()
+        for gid, entry in self._entries.items():
+            old_entry = other.get(gid)
+            if (old_entry is None
+                    or (old_entry.size, old_entry.mtime)
+                        != (entry.size, entry.mtime)):
+                changed.add(gid)
+        removed = set(other._entries) - set(self._entries)
+        return changed, removed
 
 
 class GroupsStashData:
     """
-    Class for accessing group data located in a directory stash.
+    Class for accessing group data located in a directory stash. The gids
+    are taken from the manifest of the stash (see StashManifest), which is
+    built on first use if the stash has none.
+
+    Group files may be compressed with gzip or xz (1234.json.gz), and the
+    group files of a level_1/level_2 subdirectory may be packed into a
+    level_1/level_2.zip archive (see pack-stash.py). Both are decompressed
+    as they are read.
     """
 
-    def __init__(self, stash_root, fields=None):
+    def __init__(self, stash_root, fields=None, fast_decode=True):
         self._stash_root = stash_root
         self._fields = fields
+        self._fast_decode = fast_decode
+        self._decoders = dict()
+        self._archives = dict()
         self._gid_list = None
+        self._manifest = None
 
     def lookup_gid(self, gid, fields=None):
         """
@@ -122,48 +654,202 @@ class GroupsStashData:
             fields = self._fields
         if fields is None:
             fields = ["id"]
-        level_1, level_2 = str(gid)[:2]
-        fname = str(gid) + ".json"
-        fpath = os.path.join(self._stash_root, level_1, level_2, fname)
+        decoder = self._get_decoder(fields)
         group_dict = dict(gid=gid)
         member_list = []
-        with open(fpath) as gfp:
+        with self._open_group_file(gid) as gfp:
             for line in gfp:
                 line = line.strip()
-                envelope = json.loads(line)
-                envelope_gid = envelope["group_id"]
-                envelope_member = envelope["member"]
-                member = dict()
-                for f in fields:
-                    member[f] = envelope_member[f]
-                member_list.append(tuple(member.values()))
+                member_list.append(decoder.decode(line))
         group_dict["members"] = member_list
         return group_dict
 
+    def _open_group_file(self, gid):
+        """
+        Open the group file for gid, which may be plain, compressed (see
+        stash_file_exts) or packed in the archive of its shard. A group file
+        in the shard directory wins over the archive, as it was installed
+        after the shard was packed.
+        """
+        level_1, level_2 = str(gid)[:2]
+        shard_dir = os.path.join(self._stash_root, level_1, level_2)
+        for ext in stash_file_exts:
+            fpath = os.path.join(shard_dir, str(gid) + ext)
+            try:
+                return open_stash_file(fpath)
+            except FileNotFoundError:
+                pass
+        archive = self._get_archive(level_1, level_2)
+        if archive is not None:
+            try:
+                return io.TextIOWrapper(archive.open(str(gid) + ".json"))
+            except KeyError:
+                pass
+        raise FileNotFoundError("gid {} not in stash {}".format(gid,
+            self._stash_root))
+
+    def _get_archive(self, level_1, level_2):
+        """
+        Return the open ZipFile packing the level_1/level_2 shard, or None.
+        """
+        key = (level_1, level_2)
+        if key not in self._archives:
+            fpath = os.path.join(self._stash_root, level_1,
+                    level_2 + stash_archive_ext)
+            if os.path.exists(fpath):
+                self._archives[key] = zipfile.ZipFile(fpath)
+            else:
+                self._archives[key] = None
+        return self._archives[key]
+
+    def _get_decoder(self, fields):
+        """
+        Return the StashRecordDecoder for fields.
+        """
+        key = tuple(fields)
+        decoder = self._decoders.get(key)
+        if decoder is None:
+            decoder = StashRecordDecoder(fields, fast=self._fast_decode)
+            self._decoders[key] = decoder
+        return decoder
+
+    def lookup_member_ids(self, gid):
+        """
+        Return the list of member ids for this gid.
+        """
+        return [_[0] for _ in self.lookup_gid(gid, fields=["id"])["members"]]
+
     def get_gids(self):
         """
-        Return the list of gids.
+        Return the list of gids, from the manifest (see get_manifest()).
         """
-        if not self._gid_list:
-            gid_list = []
-            for dir_name, subdir_list, file_list in os.walk(self._stash_root):
-                for fname in file_list:
-                    gid = os.path.splitext(fname)[0]
-                    gid_list.append(gid)
-            self._gid_list = gid_list
+        if self._gid_list is None:
+            self._gid_list = self.get_manifest().get_gids()
         return self._gid_list
 
+    def get_manifest(self, rescan=False):
+        """
+        Return the StashManifest of the stash. If the stash has no manifest
+        yet, one is built by walking the stash and saved. With rescan True
+        an existing manifest is reconciled with the stash (see
+        StashManifest.reconcile()) and saved again if that changed it.
+        """
+        if self._manifest is None or rescan:
+            manifest_fpath = StashManifest.path_for(self._stash_root)
+            if not os.path.exists(manifest_fpath):
+                self._manifest = StashManifest.from_stash(self._stash_root)
+                self._manifest.write(manifest_fpath)
+            else:
+                self._manifest = StashManifest.from_file(manifest_fpath)
+                if rescan and self._manifest.reconcile(self._stash_root):
+                    self._manifest.write(manifest_fpath)
+            self._gid_list = None
+        return self._manifest
+
+    def get_shards(self):
+        """
+        Return the list of shards of the stash (see stash_shards()).
+        """
+        return stash_shards(self._stash_root)
+
+    def iter_member_ids(self, workers=1, queue_size=None, gids=None):
+        """
+        Generate (gid, member_id_list) for every gid in the stash (see
+        get_gids()), or just for gids. With workers > 1 batches of gids are
+        handed out to a pool of worker processes, which
+        parse the group files and stream their results back through a queue
+        holding at most queue_size groups. The groups then arrive in no
+        particular order.
+        """
+        gids = self.get_gids() if gids is None else list(gids)
+        if workers <= 1:
+            for gid in gids:
+                yield gid, self.lookup_member_ids(gid)
+            return
+        if queue_size is None:
+            queue_size = dflt_queue_size
+        ctx = multiprocessing.get_context("fork")
+        tasks = ctx.Queue()
+        results = ctx.Queue(maxsize=queue_size)
+        batch_size = max(1, len(gids) // (workers * 8))
+        for start in range(0, len(gids), batch_size):
+            tasks.put(gids[start:start + batch_size])
+        for _ in range(workers):
+            tasks.put(None)
+        procs = [ctx.Process(target=_stash_ingest_worker,
+                    args=(self._stash_root, self._fast_decode, tasks,
+                        results))
+                for _ in range(workers)]
+        for proc in procs:
+            proc.start()
+        num_done = 0
+        try:
+            while num_done < workers:
+                result = results.get()
+                if result is None:
+                    num_done += 1
+                    continue
+                gid, member_ids = result
+                if gid is None:
+                    raise RuntimeError("stash ingest worker failed:\n{}".format(
+                        member_ids))
+                yield gid, member_ids
+        finally:
+            for proc in procs:
+                if num_done < workers:
+                    proc.terminate()
+                proc.join()
+
+
+def _stash_ingest_worker(stash_root, fast_decode, tasks, results):
+    """
+    Worker process for GroupsStashData.iter_member_ids(). Takes lists of
+    gids from tasks until it gets None, and puts
+    (gid, member_id_list) on results for each group. Puts None on results
+    when it is done, or (None, traceback) if it fails.
+    """
+    stash_data = GroupsStashData(stash_root=stash_root,
+            fast_decode=fast_decode)
+    try:
+        for gids in iter(tasks.get, None):
+            for gid in gids:
+                results.put((gid, stash_data.lookup_member_ids(gid)))
+    except Exception:
+        results.put((None, traceback.format_exc()))
+    results.put(None)
+
 
 class GroupsFileData:
     """
     Class for accessing group data located in a file.
+
+    By default the whole file is loaded into a dict. With lazy=True only a
+    gid to byte offset index is loaded, and each record is read and decoded
+    when it is looked up, keeping the last cache_size records. The index is
+    saved next to the file (see index_path_for()) and rebuilt when the file
+    changes size or mtime; if it cannot be saved, e.g. in a read-only
+    directory, it is only kept in memory. The file stays open for the
+    lookups until close(), which a with statement calls.
+
+    Either way the groups are keyed by str(id), like the other backends, and
+    looked up by a gid or its str().
     """
 
-    def __init__(self, fpath, fields=None):
+    def __init__(self, fpath, fields=None, lazy=False, cache_size=None):
         self._fpath = fpath
         self._fields = fields
-        self._groups_dict = self._load(self._fpath)
+        self._lazy = lazy
         self._gid_list = None
+        if lazy:
+            if cache_size is None:
+                cache_size = dflt_cache_size
+            self._groups_dict = None
+            self._offsets = self._load_index(self._fpath)
+            self._fp = None
+            self._read_envelope = functools.lru_cache(maxsize=cache_size)(
+                    self._read_envelope)
+        else:
+            self._groups_dict = self._load(self._fpath)
 
     @staticmethod
     def _load(fpath):
@@ -172,11 +858,93 @@ class GroupsFileData:
             for line in gfp:
                 line = line.strip()
                 envelope = json.loads(line)
-                envelope_gid = envelope["id"]
+                envelope_gid = str(envelope["id"])
                 envelope_member = envelope["members"]
                 groups_dict[envelope_gid] = envelope
         return groups_dict
 
+    @staticmethod
+    def index_path_for(fpath):
+        """
+        Return the path of the offset index of the groups file at fpath.
+        """
+        return fpath + ".idx"
+
+    @classmethod
+    def _load_index(cls, fpath):
+        """
+        Return a dict of gid to the byte offset of its record in fpath. The
+        index file has a first line with the size and mtime (ns) of the
+        groups file it was built from, then a line per gid::
+
+            1234567\t1449776819000000000
+            26434\t0
+            ...
+        """
+        st = os.stat(fpath)
+        stamp = "{}\t{}".format(st.st_size, st.st_mtime_ns)
+        index_fpath = cls.index_path_for(fpath)
+        if os.path.exists(index_fpath):
+            with open(index_fpath) as ifp:
+                if ifp.readline().rstrip("\n") == stamp:
+                    offsets = dict()
+                    for line in ifp:
+                        gid, offset = line.rstrip("\n").split("\t")
+                        offsets[gid] = int(offset)
+                    return offsets
+        offsets = dict()
+        offset = 0
+        with open(fpath, "rb") as gfp:
+            for line in gfp:
+                if line.strip():
+                    offsets[str(json.loads(line.decode())["id"])] = offset
+                offset += len(line)
+        tmp_fpath = index_fpath + ".tmp"
+        try:
+            with open(tmp_fpath, "w") as ifp:
+                print(stamp, file=ifp)
+                for gid, offset in offsets.items():
+                    print("{}\t{}".format(gid, offset), file=ifp)
+            os.replace(tmp_fpath, index_fpath)
+        except OSError as exc:
+            print("not saving the index of {}: {}".format(fpath, exc),
+                    file=sys.stderr)
+        return offsets
+
+    def _read_envelope(self, gid):
+        """
+        Read and decode the record for gid (lazy mode).
+        """
+        offset = self._offsets[gid]
+        if self._fp is None:
+            self._fp = open(self._fpath, "rb")
+        self._fp.seek(offset)
+        return json.loads(self._fp.readline().decode())
+
+    def close(self):
+        """
+        Close the groups file, if a lookup opened it (lazy mode).
+        """
+        if self._lazy and self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __contains__(self, gid):
+        if self._lazy:
+            return str(gid) in self._offsets
+        return str(gid) in self._groups_dict
+
+    def _get_envelope(self, gid):
+        if self._lazy:
+            return self._read_envelope(str(gid))
+        return self._groups_dict[str(gid)]
+
     def lookup_gid(self, gid, fields=None):
         """
         Return the group data for this gid.
@@ -184,8 +952,8 @@ class GroupsFileData:
         if fields is None:
             fields = self._fields
         if fields is None:
-            return self._groups_dict[gid]
-        gid_data = self._groups_dict[gid]
+            return self._get_envelope(gid)
+        gid_data = self._get_envelope(gid)
         if fields is None:
             caller_gid_data = gid_data
         else:
@@ -200,14 +968,390 @@ class GroupsFileData:
                 raise
         return caller_gid_data
 
+    def lookup_member_ids(self, gid):
+        """
+        Return the list of member ids for this gid.
+        """
+        return self._get_envelope(gid)["members"]
+
     def get_gids(self):
         """
         Return the list of gids.
         """
         if not self._gid_list:
-            self._gid_list = self._groups_dict.keys()
+            if self._lazy:
+                self._gid_list = self._offsets.keys()
+            else:
+                self._gid_list = self._groups_dict.keys()
+        return self._gid_list
+
+
+class MemberIdMap:
+    """
+    Class to intern raw Meetup member ids as dense member ids 0..M-1.
+
+    Dense ids are handed out in order of first appearance and never change,
+    so a map saved with save() and reloaded with from_file() gives the same
+    dense id to the same member in every rollup built with it. The file is a
+    NumPy .npy array of int64 holding the raw member id of each dense id,
+    which is memory-mapped when loaded.
+    """
+
+    def __init__(self, raw_ids=None):
+        """
+        The class constructor is not typically invoked directly. Use one
+        of the from_xxx classmethods below.
+        """
+        if raw_ids is None:
+            raw_ids = np.empty(0, dtype=np.int64)
+        self._raw_ids = raw_ids
+        self._new_raw_ids = []
+        self._dense_ids = None
+        self._sorted = None
+
+    @classmethod
+    def from_file(cls, fpath):
+        """
+        Load a saved map, or start an empty one if fpath does not exist.
+        """
+        if not os.path.exists(fpath):
+            return cls()
+        return cls(raw_ids=np.load(fpath, mmap_mode="r"))
+
+    @staticmethod
+    def path_for(rollup_fpath):
+        """
+        Return the path of the map kept next to a rollup file.
+        """
+        return os.path.splitext(rollup_fpath)[0] + ".members.npy"
+
+    def save(self, fpath):
+        """
+        Write the map to fpath. The map is written to a temporary file which
+        then replaces fpath, so a map loaded from fpath can be saved back.
+        """
+        tmp_fpath = fpath + ".tmp"
+        with open(tmp_fpath, "wb") as mfp:
+            np.save(mfp, self.raw_ids())
+        os.replace(tmp_fpath, fpath)
+
+    def __len__(self):
+        return len(self._raw_ids) + len(self._new_raw_ids)
+
+    def intern(self, member_ids):
+        """
+        Return an int32 array of the dense ids of member_ids, giving new
+        dense ids to members not seen before.
+        """
+        if self._dense_ids is None:
+            self._dense_ids = {m: i for i, m in
+                    enumerate(self._raw_ids.tolist())}
+        dense_ids = self._dense_ids
+        new_raw_ids = self._new_raw_ids
+        dense = np.empty(len(member_ids), dtype=np.int32)
+        for n, m in enumerate(member_ids):
+            i = dense_ids.get(m)
+            if i is None:
+                i = dense_ids[m] = len(dense_ids)
+                new_raw_ids.append(m)
+            dense[n] = i
+        if new_raw_ids:
+            self._sorted = None
+        return dense
+
+    def raw_ids(self, dense=None):
+        """
+        Return an int64 array of the raw member ids of the dense ids (default
+        all of them, in dense id order).
+        """
+        if self._new_raw_ids:
+            self._raw_ids = np.concatenate((self._raw_ids,
+                np.array(self._new_raw_ids, dtype=np.int64)))
+            self._new_raw_ids = []
+        if dense is None:
+            return self._raw_ids
+        return self._raw_ids[dense]
+
+    def dense_ids(self, member_ids):
+        """
+        Return an int32 array of the dense ids of member_ids, with -1 for
+        members not in the map. Nothing is added to the map.
+        """
+        raw_ids = self.raw_ids()
+        if self._sorted is None:
+            order = np.argsort(raw_ids, kind="stable")
+            self._sorted = raw_ids[order], order.astype(np.int32)
+        sorted_raw_ids, order = self._sorted
+        member_ids = np.asarray(member_ids, dtype=np.int64)
+        if not len(sorted_raw_ids):
+            return np.full(len(member_ids), -1, dtype=np.int32)
+        pos = np.searchsorted(sorted_raw_ids, member_ids)
+        pos = np.minimum(pos, len(sorted_raw_ids) - 1)
+        return np.where(sorted_raw_ids[pos] == member_ids, order[pos],
+                -1).astype(np.int32)
+
+
+class GroupsBinaryData:
+    """
+    Class for accessing group member ids located in a binary rollup file.
+
+    The file is memory-mapped and its arrays are used in place, so opening
+    it costs little more than reading the gid table, and processes that open
+    the same file share the same pages. The layout (all little-endian) is:
+
+        header          magic, num_groups, num_memberships, gid_table_bytes
+                        (struct format "<8s3Q")
+        offsets         int64[num_groups + 1], CSR offsets into members
+        members         int32[num_memberships], dense member ids, sorted
+                        within each group
+        gid table       the gids, UTF-8, separated by newlines
+
+    Group i is the i-th gid of the gid table; its dense member ids are
+    members[offsets[i]:offsets[i+1]]. The raw member ids are kept in the
+    MemberIdMap file next to the rollup (see MemberIdMap.path_for()).
+    """
+
+    magic = b"MUGRPS02"
+    header_format = "<8s3Q"
+
+    def __init__(self, fpath, fields=None):
+        self._fpath = fpath
+        self._fields = fields
+        with open(fpath, "rb") as gfp:
+            self._mmap = mmap.mmap(gfp.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, num_groups, num_memberships,
+            gid_table_bytes) = struct.unpack_from(self.header_format,
+                    self._mmap)
+        if magic != self.magic:
+            raise RuntimeError("not a binary groups file: {!r}".format(fpath))
+        pos = struct.calcsize(self.header_format)
+        self._offsets = np.frombuffer(self._mmap, dtype="<i8",
+                count=num_groups + 1, offset=pos)
+        pos += self._offsets.nbytes
+        self._members = np.frombuffer(self._mmap, dtype="<i4",
+                count=num_memberships, offset=pos)
+        pos += self._members.nbytes
+        gid_table = self._mmap[pos:pos + gid_table_bytes].decode("utf-8")
+        self._gid_list = gid_table.split("\n") if num_groups else []
+        self._gid_index = {gid: i for i, gid in enumerate(self._gid_list)}
+        member_id_map_fpath = MemberIdMap.path_for(fpath)
+        if not os.path.exists(member_id_map_fpath):
+            raise RuntimeError("missing member id map: {!r}".format(
+                member_id_map_fpath))
+        self._member_id_map = MemberIdMap.from_file(member_id_map_fpath)
+
+    @classmethod
+    def write(cls, fpath, member_sets, member_id_map):
+        """
+        Write a GroupMemberSets to a binary rollup file, and the MemberIdMap
+        its dense member ids come from next to it. Both are written to
+        temporary files which then replace the old ones, so processes that
+        have the old rollup mapped are not disturbed.
+        """
+        offsets, members = member_sets.csr_arrays()
+        gid_table = "\n".join(str(gid) for gid in member_sets.gids())
+        gid_table = gid_table.encode("utf-8")
+        tmp_fpath = fpath + ".tmp"
+        with open(tmp_fpath, "wb") as gfp:
+            gfp.write(struct.pack(cls.header_format, cls.magic,
+                len(member_sets), len(members), len(gid_table)))
+            gfp.write(np.asarray(offsets, dtype="<i8").tobytes())
+            gfp.write(np.asarray(members, dtype="<i4").tobytes())
+            gfp.write(gid_table)
+        member_id_map.save(MemberIdMap.path_for(fpath))
+        os.replace(tmp_fpath, fpath)
+
+    def get_member_id_map(self):
+        """
+        Return the MemberIdMap of the dense member ids.
+        """
+        return self._member_id_map
+
+    def lookup_dense_member_ids(self, gid):
+        """
+        Return the sorted dense member ids for this gid (a view).
+        """
+        i = self._gid_index[gid]
+        return self._members[self._offsets[i]:self._offsets[i + 1]]
+
+    def lookup_gid(self, gid, fields=None):
+        """
+        Return the group data for this gid.
+        """
+        if fields is None:
+            fields = self._fields
+        gid_data = dict(id=gid, members=self.lookup_member_ids(gid))
+        if fields is None:
+            return gid_data
+        return {f: gid_data[f] for f in fields}
+
+    def lookup_member_ids(self, gid):
+        """
+        Return the list of member ids for this gid.
+        """
+        dense = self.lookup_dense_member_ids(gid)
+        return self._member_id_map.raw_ids(dense).tolist()
+
+    def get_gids(self):
+        """
+        Return the list of gids.
+        """
+        return self._gid_list
+
+    def get_member_sets(self, gids=None):
+        """
+        Return a GroupMemberSets for gids (default all gids, in file order).
+        For the default the arrays of the file are used without copying.
+        """
+        if gids is None or list(gids) == self._gid_list:
+            return GroupMemberSets(gids=self._gid_list, offsets=self._offsets,
+                    members=self._members, member_id_map=self._member_id_map)
+        indices = [self._gid_index[gid] for gid in gids]
+        starts, stops = self._offsets[indices], self._offsets[1:][indices]
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(stops - starts, out=offsets[1:])
+        members = np.concatenate([self._members[a:b]
+            for a, b in zip(starts, stops)] or [self._members[:0]])
+        return GroupMemberSets(gids=list(gids), offsets=offsets,
+                members=members, member_id_map=self._member_id_map)
+
+
+class MemberGroupsData:
+    """
+    Class for accessing the groups of each member in a memory-mapped reverse
+    rollup file (member to groups), written by
+    GroupsData.write_member_groups().
+    The layout (all little-endian) is:
+
+        header          magic, num_members, num_memberships, num_groups,
+                        gid_table_bytes (struct format "<8s4Q")
+        member ids      int64[num_members], raw member ids, sorted
+        offsets         int64[num_members + 1], CSR offsets into groups
+        groups          int32[num_memberships], indices into the gid table,
+                        sorted within each member
+        gid table       the gids, UTF-8, separated by newlines
+
+    The groups of the i-th member id are groups[offsets[i]:offsets[i+1]], so
+    looking up a member costs a binary search plus its number of groups.
+    """
+
+    magic = b"MUMBRS01"
+    header_format = "<8s4Q"
+
+    def __init__(self, fpath):
+        self._fpath = fpath
+        with open(fpath, "rb") as mfp:
+            self._mmap = mmap.mmap(mfp.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, num_members, num_memberships, num_groups,
+            gid_table_bytes) = struct.unpack_from(self.header_format,
+                    self._mmap)
+        if magic != self.magic:
+            raise RuntimeError("not a member groups file: {!r}".format(fpath))
+        pos = struct.calcsize(self.header_format)
+        self._member_ids = np.frombuffer(self._mmap, dtype="<i8",
+                count=num_members, offset=pos)
+        pos += self._member_ids.nbytes
+        self._offsets = np.frombuffer(self._mmap, dtype="<i8",
+                count=num_members + 1, offset=pos)
+        pos += self._offsets.nbytes
+        self._groups = np.frombuffer(self._mmap, dtype="<i4",
+                count=num_memberships, offset=pos)
+        pos += self._groups.nbytes
+        gid_table = self._mmap[pos:pos + gid_table_bytes].decode("utf-8")
+        self._gid_list = gid_table.split("\n") if num_groups else []
+
+    @classmethod
+    def write(cls, fpath, member_sets):
+        """
+        Invert a GroupMemberSets and write it to a member groups file. The
+        file is written to a temporary file which then replaces the old one.
+        """
+        offsets, members = member_sets.csr_arrays()
+        group_indices = np.repeat(np.arange(len(member_sets), dtype=np.int32),
+                np.diff(offsets))
+        raw_ids = member_sets.get_member_id_map().raw_ids(members)
+        order = np.lexsort((group_indices, raw_ids))
+        raw_ids = raw_ids[order]
+        groups = group_indices[order]
+        member_ids, counts = np.unique(raw_ids, return_counts=True)
+        member_offsets = np.zeros(len(member_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=member_offsets[1:])
+        gid_table = "\n".join(str(gid) for gid in member_sets.gids())
+        gid_table = gid_table.encode("utf-8")
+        tmp_fpath = fpath + ".tmp"
+        with open(tmp_fpath, "wb") as mfp:
+            mfp.write(struct.pack(cls.header_format, cls.magic,
+                len(member_ids), len(groups), len(member_sets),
+                len(gid_table)))
+            mfp.write(np.asarray(member_ids, dtype="<i8").tobytes())
+            mfp.write(np.asarray(member_offsets, dtype="<i8").tobytes())
+            mfp.write(np.asarray(groups, dtype="<i4").tobytes())
+            mfp.write(gid_table)
+        os.replace(tmp_fpath, fpath)
+
+    def __len__(self):
+        return len(self._member_ids)
+
+    def __contains__(self, member_id):
+        return self._index(member_id) >= 0
+
+    def _index(self, member_id):
+        """
+        Return the index of member_id, or -1 if it is not in the file.
+        """
+        i = int(np.searchsorted(self._member_ids, member_id))
+        if i < len(self._member_ids) and self._member_ids[i] == member_id:
+            return i
+        return -1
+
+    def lookup_group_indices(self, member_id):
+        """
+        Return the sorted indices into get_gids() of the groups of member_id
+        (a view, empty if the member is not in the file).
+        """
+        i = self._index(member_id)
+        if i < 0:
+            return self._groups[:0]
+        return self._groups[self._offsets[i]:self._offsets[i + 1]]
+
+    def lookup_member(self, member_id):
+        """
+        Return the list of gids of the groups of member_id.
+        """
+        return [self._gid_list[_]
+                for _ in self.lookup_group_indices(member_id)]
+
+    def degree(self, member_id):
+        """
+        Return the number of groups of member_id.
+        """
+        return len(self.lookup_group_indices(member_id))
+
+    def get_member_ids(self):
+        """
+        Return the sorted int64 array of member ids.
+        """
+        return self._member_ids
+
+    def degrees(self):
+        """
+        Return the number of groups of each member, in get_member_ids()
+        order.
+        """
+        return np.diff(self._offsets)
+
+    def get_gids(self):
+        """
+        Return the list of gids that group indices refer to.
+        """
         return self._gid_list
 
+    def csr_arrays(self):
+        """
+        Return (offsets, groups), the CSR arrays of the file.
+        """
+        return self._offsets, self._groups
+
 
 class GroupsData:
 
@@ -222,23 +1366,36 @@ class GroupsData:
         self._fields = fields
 
     @classmethod
-    def from_stash(cls, stash_root, fields=None):
+    def from_stash(cls, stash_root, fields=None, fast_decode=True):
         """
-        Access Meetup group data from a directory stash of JSON files.
+        Access Meetup group data from a directory stash of JSON files. The
+        member fields are decoded with a StashRecordDecoder, which only
+        decodes the fields asked for unless fast_decode is False.
         """
         if fields is None:
             fields = ["id", "members"]
-        stash_data = GroupsStashData(stash_root=stash_root, fields=fields)
+        stash_data = GroupsStashData(stash_root=stash_root, fields=fields,
+                fast_decode=fast_decode)
         return cls(groups_data=stash_data, fields=fields)
 
     @classmethod
-    def from_file(cls, fpath, fields=None):
+    def from_file(cls, fpath, fields=None, lazy=False):
         """
-        Access Meetup group data from a JSON file.
+        Access Meetup group data from a JSON file. With lazy=True records
+        are only read as they are looked up (see GroupsFileData).
         """
-        file_data = GroupsFileData(fpath=fpath, fields=fields)
+        file_data = GroupsFileData(fpath=fpath, fields=fields, lazy=lazy)
         return cls(groups_data=file_data, fields=fields)
 
+    @classmethod
+    def from_binary(cls, fpath, fields=None):
+        """
+        Access Meetup group member ids from a binary rollup file (see
+        GroupsBinaryData), which is memory-mapped rather than parsed.
+        """
+        binary_data = GroupsBinaryData(fpath=fpath, fields=fields)
+        return cls(groups_data=binary_data, fields=fields)
+
     def write_file(self, fpath, fields=None):
         """
         Rollup Meetup group data and write it to a file.
@@ -250,16 +1407,131 @@ class GroupsData:
                 data = self._groups_data.lookup_gid(gid, fields=fields)
                 print("{}".format(json.dumps(data)), file=gfp)
 
-    def write_member_ids(self, fpath):
+    def write_member_ids(self, fpath, workers=1):
         """
         Rollup Meetup group member ids per group and write them to a file.
+        For a stash, workers > 1 reads the stash in parallel (see
+        iter_member_ids()), and the groups are written in the order they
+        arrive. The stash manifest is saved next to the file for
+        update_rollup().
         """
+        manifest = self.get_manifest()
         with open(fpath, "w") as gfp:
-            for gid in self._groups_data.get_gids():
-                data = self._groups_data.lookup_gid(gid, fields=["id"])
-                member_ids = [_[0] for _ in data["members"]]
+            for gid, member_ids in self.iter_member_ids(workers=workers):
                 d = dict(id=gid, members=member_ids)
                 print("{}".format(json.dumps(d)), file=gfp)
+        if manifest is not None:
+            manifest.write(StashManifest.path_for_rollup(fpath))
+
+    def write_binary(self, fpath, workers=1):
+        """
+        Rollup Meetup group member ids per group and write them to a binary
+        file that can be opened with from_binary(). The groups are written in
+        gid order. Member ids are interned with the MemberIdMap kept next to
+        fpath, which is created or extended, so dense member ids stay the
+        same from one rollup to the next. For a stash, workers > 1 reads the
+        stash in parallel (see iter_member_ids()). The stash manifest is
+        saved next to the file for update_rollup().
+        """
+        manifest = self.get_manifest()
+        member_id_map = MemberIdMap.from_file(MemberIdMap.path_for(fpath))
+        if workers <= 1:
+            member_sets = self.get_member_sets(gids=sorted(self.get_gids()),
+                    member_id_map=member_id_map)
+        else:
+            groups = dict(self.iter_member_ids(workers=workers))
+            member_sets = GroupMemberSets.from_member_ids(
+                    ((gid, groups.pop(gid)) for gid in sorted(groups)),
+                    member_id_map=member_id_map)
+        GroupsBinaryData.write(fpath, member_sets, member_id_map)
+        if manifest is not None:
+            manifest.write(StashManifest.path_for_rollup(fpath))
+
+    def write_member_groups(self, fpath, workers=1):
+        """
+        Write the reverse rollup of the groups data, the gids of the groups
+        of each member, to a file that can be opened with MemberGroupsData.
+        The gids are in sorted order. For a stash, workers > 1 reads the
+        stash in parallel (see iter_member_ids()).
+        """
+        if workers <= 1 or not isinstance(self._groups_data,
+                GroupsStashData):
+            member_sets = self.get_member_sets(gids=sorted(self.get_gids()))
+        else:
+            groups = dict(self.iter_member_ids(workers=workers))
+            member_sets = GroupMemberSets.from_member_ids(
+                    (gid, groups.pop(gid)) for gid in sorted(groups))
+        MemberGroupsData.write(fpath, member_sets)
+
+    def update_rollup(self, fpath, workers=1):
+        """
+        Bring a rollup of a stash written by write_member_ids() or
+        write_binary() (by extension .bin) up to date. Only the groups whose
+        files are new or changed since the manifest saved with the rollup are
+        read from the stash; the others are copied from the rollup, and
+        groups no longer in the stash are dropped. Without a saved manifest
+        the rollup is rewritten in full. Return (changed, removed), the sets
+        of gids read from the stash and dropped.
+        """
+        binary = os.path.splitext(fpath)[1] == ".bin"
+        manifest = self.get_manifest()
+        rollup_manifest_fpath = StashManifest.path_for_rollup(fpath)
+        if not (os.path.exists(fpath)
+                and os.path.exists(rollup_manifest_fpath)):
+            if binary:
+                self.write_binary(fpath, workers=workers)
+            else:
+                self.write_member_ids(fpath, workers=workers)
+            return set(manifest.get_gids()), set()
+        changed, removed = manifest.diff(
+                StashManifest.from_file(rollup_manifest_fpath))
+        groups = dict(self.iter_member_ids(workers=workers,
+            gids=sorted(changed)))
+        if binary:
+            old_data = GroupsBinaryData(fpath)
+            member_id_map = old_data.get_member_id_map()
+            member_sets = GroupMemberSets.from_dense_member_ids(
+                    ((gid, member_id_map.intern(groups.pop(gid))
+                        if gid in changed
+                        else old_data.lookup_dense_member_ids(gid))
+                        for gid in sorted(manifest.get_gids())),
+                    member_id_map=member_id_map)
+            GroupsBinaryData.write(fpath, member_sets, member_id_map)
+        else:
+            tmp_fpath = fpath + ".tmp"
+            with open(fpath) as old_gfp, open(tmp_fpath, "w") as gfp:
+                for line in old_gfp:
+                    gid = json.loads(line)["id"]
+                    if gid in manifest and gid not in changed:
+                        gfp.write(line)
+                for gid, member_ids in groups.items():
+                    d = dict(id=gid, members=member_ids)
+                    print("{}".format(json.dumps(d)), file=gfp)
+            os.replace(tmp_fpath, fpath)
+        manifest.write(rollup_manifest_fpath)
+        return changed, removed
+
+    def get_manifest(self, rescan=False):
+        """
+        Return the StashManifest for a stash (see
+        GroupsStashData.get_manifest()), or None for other sources.
+        """
+        if isinstance(self._groups_data, GroupsStashData):
+            return self._groups_data.get_manifest(rescan=rescan)
+        return None
+
+    def iter_member_ids(self, workers=1, gids=None):
+        """
+        Generate (gid, member_id_list) for every gid, or just for gids. For a
+        stash, workers > 1 reads the stash with a pool of worker processes,
+        and the groups arrive in no particular order.
+        """
+        if isinstance(self._groups_data, GroupsStashData):
+            yield from self._groups_data.iter_member_ids(workers=workers,
+                    gids=gids)
+            return
+        for gid in (self._groups_data.get_gids() if gids is None else gids):
+            yield gid, self._groups_data.lookup_member_ids(gid)
 
     def lookup_gid(self, gid, fields=None):
         """
@@ -269,12 +1541,214 @@ class GroupsData:
             fields = self._fields
         return self._groups_data.lookup_gid(gid, fields=fields)
 
+    def lookup_member_ids(self, gid):
+        """
+        Return the list of member ids for a gid.
+        """
+        return self._groups_data.lookup_member_ids(gid)
+
     def get_gids(self):
         """
         Return the list of gids.
         """
         return self._groups_data.get_gids()
 
+    def get_member_sets(self, gids=None, member_id_map=None):
+        """
+        Return a GroupMemberSets holding the member ids of each gid (default
+        all gids, in get_gids() order). Member ids are interned with
+        member_id_map (default a new MemberIdMap). For a binary rollup the
+        MemberIdMap next to the rollup is always used.
+        """
+        if isinstance(self._groups_data, GroupsBinaryData):
+            return self._groups_data.get_member_sets(gids)
+        if gids is None:
+            gids = self.get_gids()
+        return GroupMemberSets.from_member_ids(
+                ((gid, self.lookup_member_ids(gid)) for gid in gids),
+                member_id_map=member_id_map)
+
+    def get_member_id_map(self):
+        """
+        Return the MemberIdMap of a binary rollup, or None for other sources.
+        """
+        if isinstance(self._groups_data, GroupsBinaryData):
+            return self._groups_data.get_member_id_map()
+        return None
+
+
+class GroupMemberSets:
+
+    """
+    Compact member sets for a list of groups, for counting the members that
+    two or three groups have in common. Member ids are interned to dense ints
+    0..M-1, and the members of group i are the sorted, duplicate free slice
+    members[offsets[i]:offsets[i+1]] of one int32 array. Counting is done a
+    row at a time, for one set of members against many groups (see
+    count_common_many()), or for a table of groups with the incidence matrix
+    of select(), so that no intersection is built and the NumPy calls are
+    not paid per pair.
+    """
+
+    def __init__(self, gids, offsets, members, member_id_map=None):
+        """
+        The class constructor is not typically invoked directly. Use one
+        of the from_xxx classmethods below, or GroupsData.get_member_sets().
+        """
+        self._gids = gids
+        self._offsets = offsets
+        self._members = members
+        self._member_id_map = member_id_map
+
+    @classmethod
+    def from_member_ids(cls, items, member_id_map=None):
+        """
+        Build the member sets from an iterable of (gid, member_id_list),
+        interning the member ids with member_id_map (default a new
+        MemberIdMap).
+        """
+        if member_id_map is None:
+            member_id_map = MemberIdMap()
+        return cls.from_dense_member_ids(
+                ((gid, member_id_map.intern(member_ids))
+                    for gid, member_ids in items),
+                member_id_map=member_id_map)
+
+    @classmethod
+    def from_dense_member_ids(cls, items, member_id_map):
+        """
+        Build the member sets from an iterable of (gid, dense_member_ids),
+        where the dense member ids come from member_id_map.
+        """
+        gids = []
+        offsets = [0]
+        chunks = []
+        for gid, dense in items:
+            dense = np.unique(dense)
+            gids.append(gid)
+            chunks.append(dense)
+            offsets.append(offsets[-1] + len(dense))
+        if chunks:
+            members = np.concatenate(chunks)
+        else:
+            members = np.empty(0, dtype=np.int32)
+        return cls(gids=gids, offsets=np.array(offsets, dtype=np.int64),
+                members=members, member_id_map=member_id_map)
+
+    def __len__(self):
+        return len(self._gids)
+
+    def gids(self):
+        """
+        Return the list of gids; group i is gids()[i].
+        """
+        return self._gids
+
+    def get_member_id_map(self):
+        """
+        Return the MemberIdMap of the dense member ids.
+        """
+        return self._member_id_map
+
+    def num_members(self):
+        """
+        Return the number of distinct members in all the groups.
+        """
+        return len(self._member_id_map)
+
+    def csr_arrays(self):
+        """
+        Return the arrays (offsets, members) holding all the member sets.
+        """
+        return self._offsets, self._members
+
+    def members(self, i):
+        """
+        Return the sorted dense member ids of group i (a view).
+        """
+        return self._members[self._offsets[i]:self._offsets[i + 1]]
+
+    def size(self, i):
+        """
+        Return the number of members of group i.
+        """
+        return int(self._offsets[i + 1] - self._offsets[i])
+
+    def sizes(self):
+        """
+        Return an array of the number of members of every group.
+        """
+        return np.diff(self._offsets)
+
+    def count_common(self, i, j):
+        """
+        Return the number of members groups i and j have in common. To count
+        the members i has in common with many groups, count_common_many() is
+        much faster than calling this for each of them.
+        """
+        return int(self.count_common_many(self.members(i), [j])[0])
+
+    def count_common_many(self, values, js):
+        """
+        Return an int64 array of the number of the sorted dense member ids
+        values (e.g. members(i)) that each group in js has. The members of
+        all the groups are searched for in values with one np.searchsorted()
+        call, and only the counts are allocated per group.
+        """
+        candidates, bounds = self._gather(js)
+        if not len(values) or not len(candidates):
+            return np.zeros(len(bounds) - 1, dtype=np.int64)
+        found = np.zeros(len(candidates) + 1, dtype=np.int64)
+        np.cumsum(_in_sorted(candidates, values), out=found[1:])
+        return found[bounds[1:]] - found[bounds[:-1]]
+
+    def select(self, js, within=None):
+        """
+        Return (indptr, indices, num_columns), the members of the groups js
+        as the rows of a CSR incidence matrix. With within, a sorted array
+        of dense member ids, only the members in it are kept and column c
+        stands for member within[c]; otherwise column c is member c. The
+        product of the matrix with its transpose counts the members (in
+        within) that every pair of the groups have in common.
+        """
+        candidates, bounds = self._gather(js)
+        if within is None:
+            num_columns = int(self._members.max()) + 1 if len(
+                    self._members) else 0
+            return bounds, candidates, num_columns
+        pos = np.searchsorted(within, candidates)
+        keep = within.take(pos, mode="clip") == candidates if len(
+                within) else np.zeros(len(candidates), dtype=bool)
+        kept = np.zeros(len(candidates) + 1, dtype=np.int64)
+        np.cumsum(keep, out=kept[1:])
+        return kept[bounds], pos[keep], len(within)
+
+    def _gather(self, js):
+        """
+        Return (candidates, bounds): the members of the groups js, one after
+        the other, and the bounds of each group's members in candidates,
+        which has those of js[x] at bounds[x]:bounds[x + 1]. A range of
+        groups is one slice of the members array.
+        """
+        if isinstance(js, range) and js.step == 1 and len(js):
+            bounds = self._offsets[js.start:js.stop + 1]
+            return self._members[bounds[0]:bounds[-1]], bounds - bounds[0]
+        js = np.asarray(js, dtype=np.int64)
+        starts = self._offsets[js]
+        lens = self._offsets[js + 1] - starts
+        bounds = np.zeros(len(js) + 1, dtype=np.int64)
+        np.cumsum(lens, out=bounds[1:])
+        return self._members[np.arange(bounds[-1])
+                + np.repeat(starts - bounds[:-1], lens)], bounds
+
+
+def _in_sorted(values, sorted_array):
+    """
+    Return a boolean array telling which of values are in sorted_array.
+    """
+    pos = np.searchsorted(sorted_array, values)
+    return sorted_array.take(pos, mode="clip") == values
+
 
 # A sample line from the json file for group_id 26434. The data downloaded
 # using the MeetUp API is the dict with key "member" in this structure. It
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import click
+import itertools
+import os
+from groupgraph import GroupGraphGen
+from groupgraph import aggregations
+from groupgraph import dflt_aggregation
+
+def merged_from_ncol_files(ncol_files, aggregation=None, max_edges=None,
+        tmp_dir=None, workers=None):
+    edges = itertools.chain.from_iterable(
+            GroupGraphGen.from_path(_, workers=workers) for _ in ncol_files)
+    yield from GroupGraphGen(edges).merge_dups(aggregation=aggregation,
+            max_edges=max_edges, tmp_dir=tmp_dir)
+
+@click.command()
+@click.option("--aggregate", "aggregation", type=click.Choice(aggregations),
+        default=dflt_aggregation,
+        help=("Weight of an edge that appears more than once: that of its"
+                " first copy, or the sum, max or mean of all the copies."))
+@click.option("--max-edges", type=click.IntRange(min=1),
+        help=("Sort at most this many edges in memory at a time, spilling"
+                " sorted runs to disk (default: 1048576)."))
+@click.option("--tmp-dir", type=click.Path(),
+        help="Directory for sorted runs (default: system temp dir).")
+@click.option("--workers", default=1,
+        help="Number of worker processes parsing each NCOL file.")
+@click.argument("ncol_files", nargs=-1, required=True,
+        type=click.Path(exists=True))
+@click.argument("out_file", type=click.Path())
+def go(aggregation, max_edges, tmp_dir, workers, ncol_files, out_file):
+    """
+    Merges edge-list files, such as the graphs of separate runs, into one
+    graph with one edge per pair of nodes. The NCOL format is:
+
+        \b
+        node1 node2 weight
+        node3 node4 weight
+        ...
+
+    Each edge is written as (min(node1, node2), max(node1, node2)), and the
+    edges are sorted by that pair, so the output can be streamed or
+    binary-searched. The input files are merged with an external merge sort,
+    so memory use is bounded by --max-edges.
+
+    Any of the files may instead be in the binary edge format (see
+    GroupGraphBinary), chosen by the extension .bin.
+    """
+    edges = merged_from_ncol_files(ncol_files, aggregation=aggregation,
+            max_edges=max_edges, tmp_dir=tmp_dir, workers=workers)
+    if os.path.splitext(out_file)[1] == ".bin":
+        GroupGraphGen(edges).write_binary(out_file)
+        return
+    with click.open_file(out_file, "w") as ofp:
+        for g1, g2, w in edges:
+            print("{} {} {}".format(g1, g2, w), file=ofp)
+
+if __name__ == '__main__':
+    go()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+
+import click
+from groupgraph import GroupGraphBinary
+from groupgraph import GroupGraphChunks
+
+@click.command()
+@click.option("--workers", default=1,
+        help="Number of worker processes parsing the NCOL file.")
+@click.argument("ncol_file", type=click.Path())
+@click.argument("bin_file", type=click.Path())
+def go(workers, ncol_file, bin_file):
+    """
+    Convert an edge-list file from NCOL format to the binary edge format
+    (see GroupGraphBinary), which later stages read without parsing text.
+    The NCOL format is:
+
+        \b
+        node1 node2 weight
+        node3 node4 weight
+        ...
+    """
+    GroupGraphChunks.from_file(ncol_file, workers=workers).write_binary(
+            bin_file)
+    graph = GroupGraphBinary(bin_file)
+    print("wrote {} edges, {} nodes".format(len(graph), len(graph.nodes())))
+
+if __name__ == '__main__':
+    go()
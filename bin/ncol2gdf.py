@@ -1,59 +1,102 @@
 #!/usr/bin/env python
 
 import click
+import shutil
+import tempfile
+from groupgraph import GroupGraphGen
+from groupgraph import dedup_edges
+from meetupdata import GroupGidMap
 
 
-def get_nodes(ncol_fp):
-    nodes = set()
-    for line in ncol_fp:
-        line = line.strip()
-        n1, n2, _ = line.split()
-        nodes.add(n1)
-        nodes.add(n2)
-    return nodes
-
-
-def edges_gen(ncol_fp):
-    edges = set()
-    num_edges, num_dups = 0, 0
-    for line in ncol_fp:
-        num_edges += 1
-        line = line.strip()
-        n1, n2, w = line.split()
-        n1, n2 = min(n1, n2), max(n1, n2)
-        if (n1, n2) in edges:
-            # This edge has already been seen.
-            num_dups += 1
-            continue
-        edges.add((n1, n2))
-        w = int(w)
+def gdf_str(value):
+    """
+    Format value for a VARCHAR field of a GDF file: quoted, with any double
+    quotes in it replaced by single quotes.
+    """
+    if value is None:
+        return ""
+    return '"{}"'.format(str(value).replace('"', "'"))
+
+
+def gdf_int(value):
+    """
+    Format value for an INT field of a GDF file.
+    """
+    if value is None:
+        return ""
+    return "{}".format(int(value))
+
+
+def edges_gen(graph, max_edges=None, tmp_dir=None):
+    counts = dict(num_edges=0, num_kept=0)
+    def graph_edges():
+        for n1, n2, w in graph:
+            counts["num_edges"] += 1
+            yield min(n1, n2), max(n1, n2), w
+    for n1, n2, w in dedup_edges(graph_edges(), max_edges=max_edges,
+            tmp_dir=tmp_dir):
+        counts["num_kept"] += 1
         yield n1, n2, w
-    print("read {} edges ({} dups)".format(num_edges, num_dups))
+    print("read {} edges ({} dups)".format(counts["num_edges"],
+        counts["num_edges"] - counts["num_kept"]))
 
 
 @click.command()
+@click.option('--groups-file', 'groups_file', type=click.Path(),
+        help=('File of group information (.json, .txt or .db) to take'
+                ' node labels and member counts from.'))
+@click.option('--max-edges', type=click.IntRange(min=1),
+        help=('Keep at most this many edges in memory while removing'
+                ' duplicates, spilling the rest to disk (default: keep all).'))
+@click.option('--tmp-dir', type=click.Path(),
+        help=('Directory for spooled and spilled edges (default: system'
+                ' temp dir).'))
+@click.option('--workers', default=1,
+        help='Number of worker processes parsing an NCOL ncol-file.')
 @click.argument('ncol-file', type=click.Path())
 @click.argument('gdf-file', type=click.Path())
-def go(ncol_file, gdf_file):
+def go(groups_file, max_edges, tmp_dir, workers, ncol_file, gdf_file):
     """
-    Convert a group graph file from NCOL format to GDF format.
+    Convert a group graph file from NCOL format to GDF format. If ncol-file
+    has the extension .bin it is read in the binary edge format instead
+    (see GroupGraphBinary).
+
+    The edges are read once: they are spooled to a temporary file while the
+    nodes are collected, then the nodes and the spooled edges are written.
+    With --groups-file, each node also gets the group name as its label and
+    the group's member count, looked up for all the nodes at once.
     """
-    with click.open_file(ncol_file) as ncol_fp:
-        nodes = get_nodes(ncol_fp)
-    print("read {} nodes".format(len(nodes)))
-    with click.open_file(ncol_file) as ncol_fp:
+    nodes = set()
+    num_edges = 0
+    with tempfile.TemporaryFile("w+", dir=tmp_dir) as spool_fp:
+        for n1, n2, w in edges_gen(GroupGraphGen.from_path(ncol_file,
+                workers=workers), max_edges=max_edges, tmp_dir=tmp_dir):
+            nodes.add(n1)
+            nodes.add(n2)
+            num_edges += 1
+            print("{},{},{}".format(n1, n2, w), file=spool_fp)
+        print("read {} nodes".format(len(nodes)))
         with click.open_file(gdf_file, "w") as gdf_fp:
-            print("nodedef>name VARCHAR", file=gdf_fp)
+            if groups_file:
+                gid_map = GroupGidMap.from_file(groups_file)
+                attrs = gid_map.get_many(nodes, keys=["name", "members"])
+                print("nodedef>name VARCHAR,label VARCHAR,members INT",
+                        file=gdf_fp)
+            else:
+                print("nodedef>name VARCHAR", file=gdf_fp)
             num_nodes = 0
             for n in sorted(nodes):
                 num_nodes += 1
-                print("{}".format(n), file=gdf_fp)
+                if groups_file:
+                    attr = attrs.get(n, {})
+                    print("{},{},{}".format(n, gdf_str(attr.get("name")),
+                        gdf_int(attr.get("members"))), file=gdf_fp)
+                else:
+                    print("{}".format(n), file=gdf_fp)
             print("wrote {} nodes".format(num_nodes))
             print("edgedef>node1 VARCHAR,node2 VARCHAR,weight INT", file=gdf_fp)
-            num_edges = 0
-            for n1, n2, w in edges_gen(ncol_fp):
-                num_edges += 1
-                print("{},{},{}".format(n1, n2, w), file=gdf_fp)
+            spool_fp.seek(0)
+            shutil.copyfileobj(spool_fp, gdf_fp)
             print("wrote {} edges".format(num_edges))
 
 if __name__ == '__main__':
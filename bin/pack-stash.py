@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+import click
+import gzip
+import lzma
+import os
+import shutil
+import zipfile
+from meetupdata import GroupsStashData
+from meetupdata import stash_archive_ext
+from meetupdata import stash_gid
+from meetupdata import open_stash_file
+from workerpool import map_tasks
+
+dflt_compress = "gz"
+compressions = ["none", "gz", "xz"]
+dflt_workers = 1
+
+file_exts = dict(none=".json", gz=".json.gz", xz=".json.xz")
+file_openers = dict(none=open, gz=gzip.open, xz=lzma.open)
+zip_compressions = dict(none=zipfile.ZIP_STORED, gz=zipfile.ZIP_DEFLATED,
+        xz=zipfile.ZIP_LZMA)
+
+
+def pack_shard_files(shard, compress):
+    """
+    Rewrite each group file in the shard directory with the compression
+    compress. Return the number of group files rewritten.
+    """
+    num_files = 0
+    for fname in sorted(os.listdir(shard)):
+        fpath = os.path.join(shard, fname)
+        new_fpath = os.path.join(shard, stash_gid(fname) + file_exts[compress])
+        if new_fpath == fpath:
+            continue
+        with open_stash_file(fpath, "rb") as ifp, \
+                file_openers[compress](new_fpath + ".tmp", "wb") as ofp:
+            shutil.copyfileobj(ifp, ofp)
+        os.replace(new_fpath + ".tmp", new_fpath)
+        os.remove(fpath)
+        num_files += 1
+    return num_files
+
+
+def pack_shard_archive(shard, compress):
+    """
+    Pack the group files of the shard directory into the archive shard.zip,
+    merging them with the groups already in the archive (the files win), and
+    remove the directory. The members keep the modification times of the
+    group files, which the stash manifest records. Return the number of group
+    files packed.
+    """
+    archive_fpath = shard + stash_archive_ext
+    tmp_fpath = archive_fpath + ".tmp"
+    fnames = sorted(os.listdir(shard))
+    gids = set(stash_gid(_) for _ in fnames)
+    with zipfile.ZipFile(tmp_fpath, "w", zip_compressions[compress]) as ozf:
+        if os.path.exists(archive_fpath):
+            with zipfile.ZipFile(archive_fpath) as izf:
+                for info in izf.infolist():
+                    if stash_gid(info.filename) not in gids:
+                        ozf.writestr(info, izf.read(info),
+                                compress_type=zip_compressions[compress])
+        for fname in fnames:
+            fpath = os.path.join(shard, fname)
+            info = zipfile.ZipInfo.from_file(fpath, stash_gid(fname) + ".json")
+            with open_stash_file(fpath, "rb") as ifp:
+                ozf.writestr(info, ifp.read(),
+                        compress_type=zip_compressions[compress])
+    os.replace(tmp_fpath, archive_fpath)
+    shutil.rmtree(shard)
+    return len(fnames)
+
+
+def pack_shard(args):
+    shard, compress, archive = args
+    if archive:
+        return pack_shard_archive(shard, compress)
+    return pack_shard_files(shard, compress)
+
+
+if __name__ == '__main__':
+
+    @click.command()
+    @click.option("--compress", type=click.Choice(compressions),
+            default=dflt_compress,
+            help="Compression of the group files or archive members.")
+    @click.option("--archive/--no-archive",
+            help=("Pack the group files of each level_1/level_2"
+                    " subdirectory into a level_1/level_2.zip archive."))
+    @click.option("--workers", default=dflt_workers,
+            help="Number of worker processes packing shards.")
+    @click.argument("stash-root", type=click.Path())
+    def go(compress, archive, workers, stash_root):
+        """
+        Compress the group files of the stash located at stash-root, or pack
+        them into one archive per level_1/level_2 subdirectory, then rebuild
+        the stash manifest. GroupsStashData reads the packed stash the same
+        way as the plain one.
+        """
+        print("compress: {}".format(compress))
+        print("archive: {}".format(archive))
+        print("workers: {}".format(workers))
+        print("stash-root: {}".format(stash_root))
+        stash_data = GroupsStashData(stash_root)
+        shards = [_ for _ in stash_data.get_shards()
+                if not _.endswith(stash_archive_ext)]
+        tasks = [(shard, compress, archive) for shard in shards]
+        num_files = 0
+        for n in map_tasks(pack_shard, tasks, workers, ordered=False):
+            num_files += n
+            print(".", end="", flush=True)
+        print()
+        manifest = stash_data.get_manifest(rescan=True)
+        print("packed {} group files in {} shards; manifest: {} gids".format(
+            num_files, len(shards), len(manifest)))
+
+    go()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+import json
+import numpy as np
+import re
+import scipy.sparse
+
+_dendrogram_re = re.compile(r"(\d+) items in dendrogram$")
+_partition_re = re.compile(r"partition at level (\d+) is$")
+_nodes_prefix = "nodes: "
+
+
+def read_cluster_file(fpath, level=None):
+    """
+    Read the partition at level (default: the top level) from a cluster
+    file written by comm_dendrogram.py, into a dict of gid to community.
+    The communities are taken from the "nodes: [...]" lines of the level
+    and numbered in the order of the file.
+    """
+    partition = dict()
+    with open(fpath) as cfp:
+        match = _dendrogram_re.match(cfp.readline().strip())
+        if match is None:
+            raise ValueError("not a cluster file: {!r}".format(fpath))
+        if level is None:
+            level = int(match.group(1)) - 1
+        file_level = None
+        community = 0
+        for line in cfp:
+            match = _partition_re.match(line)
+            if match is not None:
+                file_level = int(match.group(1))
+                if file_level > level:
+                    break
+            elif file_level == level and line.startswith(_nodes_prefix):
+                for gid in json.loads(line[len(_nodes_prefix):]):
+                    partition[gid] = community
+                community += 1
+    if file_level is None or file_level < level:
+        raise ValueError("no level {} in {!r}".format(level, fpath))
+    return partition
+
+
+def read_partition(fpath, level=None):
+    """
+    Read a partition, as a dict of gid to community, from a cluster file
+    (see read_cluster_file()) or from a partition file of lines
+    "gid community" (see csrlouvain.write_partition()), which has no levels.
+    """
+    with open(fpath) as pfp:
+        first_line = pfp.readline().strip()
+    if _dendrogram_re.match(first_line):
+        return read_cluster_file(fpath, level=level)
+    partition = dict()
+    with open(fpath) as pfp:
+        for line in pfp:
+            gid, community = line.split()
+            partition[gid] = community
+    return partition
+
+
+class LabelArrays:
+    def __init__(self, partitions):
+        """
+        The partitions of a list of dicts of gid to community, as arrays of
+        community labels over the gids they all have: labels[i][j] is the
+        community, numbered from 0, of gids[j] in partitions[i]. Numbering
+        the communities once lets every pair of partitions be compared with
+        array operations only.
+        """
+        gids = set(partitions[0]) if partitions else set()
+        for partition in partitions[1:]:
+            gids.intersection_update(partition)
+        self.gids = sorted(gids)
+        self.labels = []
+        for partition in partitions:
+            communities = [partition[_] for _ in self.gids]
+            labels = np.unique(np.array(communities, dtype=str),
+                    return_inverse=True)[1] if communities else \
+                            np.empty(0, dtype=np.int64)
+            self.labels.append(labels.astype(np.int64).ravel())
+
+    def __len__(self):
+        return len(self.labels)
+
+    def contingency(self, i, j):
+        """
+        Return the contingency table of partitions i and j, a sparse matrix
+        of the number of gids in each pair of their communities.
+        """
+        return contingency_table(self.labels[i], self.labels[j])
+
+    def compare(self, i, j):
+        """
+        Return the scores of partitions i and j (see compare_table()).
+        """
+        return compare_table(self.contingency(i, j))
+
+
+def contingency_table(labels_1, labels_2):
+    """
+    Return the contingency table of two arrays of community labels (ints
+    from 0) over the same gids, as a CSR matrix: table[a, b] is the number
+    of gids in community a of the first and community b of the second.
+    """
+    shape = (labels_1.max() + 1 if len(labels_1) else 0,
+            labels_2.max() + 1 if len(labels_2) else 0)
+    table = scipy.sparse.coo_matrix(
+            (np.ones(len(labels_1), dtype=np.int64), (labels_1, labels_2)),
+            shape=shape).tocsr()
+    table.sum_duplicates()
+    return table
+
+
+def _pairs(counts):
+    return float((counts * (counts - 1)).sum() / 2)
+
+
+def _entropy(counts, n):
+    p = counts[counts > 0] / n
+    return float(-(p * np.log(p)).sum())
+
+
+def compare_table(table):
+    """
+    Return a dict of scores for two partitions with contingency table
+    (see contingency_table()):
+
+        nmi: normalized mutual information, 2 I / (H1 + H2), in [0, 1]
+        ari: adjusted Rand index, 1 for equal partitions, about 0 at chance
+        vi: variation of information, H1 + H2 - 2 I, in nats, 0 if equal
+
+    and the size n and community counts k1 and k2.
+    """
+    n = int(table.sum())
+    sizes_1 = np.asarray(table.sum(axis=1)).ravel()
+    sizes_2 = np.asarray(table.sum(axis=0)).ravel()
+    scores = dict(n=n, k1=int((sizes_1 > 0).sum()),
+            k2=int((sizes_2 > 0).sum()))
+    if n == 0:
+        scores.update(nmi=1.0, ari=1.0, vi=0.0)
+        return scores
+    coo = table.tocoo()
+    h_1 = _entropy(sizes_1, n)
+    h_2 = _entropy(sizes_2, n)
+    mutual = float((coo.data / n * np.log(coo.data * n
+        / (sizes_1[coo.row] * sizes_2[coo.col]))).sum())
+    scores["nmi"] = 2 * mutual / (h_1 + h_2) if h_1 + h_2 > 0 else 1.0
+    scores["vi"] = max(h_1 + h_2 - 2 * mutual, 0.0)
+    pairs_both = _pairs(coo.data)
+    pairs_1 = _pairs(sizes_1)
+    pairs_2 = _pairs(sizes_2)
+    expected = pairs_1 * pairs_2 / (n * (n - 1) / 2) if n > 1 else 0.0
+    maximum = (pairs_1 + pairs_2) / 2
+    if maximum == expected:
+        scores["ari"] = 1.0
+    else:
+        scores["ari"] = (pairs_both - expected) / (maximum - expected)
+    return scores
+
+
+def best_matches(table):
+    """
+    For each community of the first partition of contingency table (see
+    contingency_table()), find the community of the second that overlaps
+    it most. Return the arrays (sizes, matches, overlaps, jaccards): the
+    size of each community, the label of its best match, the number of
+    gids they share, and the Jaccard index of the two.
+    """
+    sizes_1 = np.asarray(table.sum(axis=1)).ravel()
+    sizes_2 = np.asarray(table.sum(axis=0)).ravel()
+    matches = np.asarray(table.argmax(axis=1)).ravel()
+    overlaps = np.asarray(table.max(axis=1).todense()).ravel()
+    unions = sizes_1 + sizes_2[matches] - overlaps
+    jaccards = np.where(unions > 0, overlaps / np.maximum(unions, 1), 0.0)
+    return sizes_1, matches, overlaps, jaccards
@@ -1,41 +1,91 @@
 #!/usr/bin/env python
 
 import click
+import os
 import sys
 from meetupdata import GroupsData
+from meetupdata import StashManifest
 
 if __name__ == '__main__':
 
     @click.command()
     @click.option("--check/--no-check",
-            help=("After writing the output file, check that it has"
-                    " the same group_ids as the stash."))
+            help=("After writing the output file, check that the manifest"
+                    " saved next to it matches the stash manifest."))
+    @click.option("--fast-decode/--no-fast-decode", default=True,
+            help=("Decode only the member ids from the stash records"
+                    " instead of whole records."))
+    @click.option("--incremental/--no-incremental",
+            help=("Only read the group files that are new or changed since"
+                    " groups-file was written, and merge them into it."))
+    @click.option("--rescan/--no-rescan",
+            help=("Reconcile the stash manifest kept by stash.sh install"
+                    " with a listing of the stash, re-reading the group"
+                    " files that are new or changed."))
+    @click.option("--member-groups-file", type=click.Path(),
+            help=("Also write the reverse rollup, the groups of each"
+                    " member, to this file (see MemberGroupsData)."))
+    @click.option("--workers", default=1,
+            help=("Number of worker processes reading the stash; the"
+                    " groups in a JSON groups-file are then unordered."))
     @click.argument("stash-root", type=click.Path())
     @click.argument("groups-file", type=click.Path())
-    def go(check, stash_root, groups_file):
+    def go(check, fast_decode, incremental, rescan, member_groups_file,
+            workers, stash_root, groups_file):
         """
         Read the stash located at stash-root and write the groups data to
         a file at groups-file. Only the fields "group_id" and the corresponding
         list of member ids will be written.
+
+        If groups-file has the extension .bin, the rollup is written in the
+        binary format read by GroupsData.from_binary(), otherwise as JSON.
+
+        The stash manifest is saved next to groups-file, which is what
+        --incremental and --check compare the stash manifest against.
+        --rescan first brings the stash manifest in line with the stash,
+        for group files added, changed or removed other than by
+        "stash.sh install".
         """
         print("stash-root: {}".format(stash_root))
         print("groups-file: {}".format(groups_file))
         print("check: {}".format(check))
-        with click.open_file(groups_file, "w") as ofp:
-            g = GroupsData.from_stash(stash_root, fields=["id"])
-            g.write_member_ids(groups_file)
+        print("fast-decode: {}".format(fast_decode))
+        print("incremental: {}".format(incremental))
+        print("rescan: {}".format(rescan))
+        print("member-groups-file: {}".format(member_groups_file))
+        print("workers: {}".format(workers))
+        binary = os.path.splitext(groups_file)[1] == ".bin"
+        g = GroupsData.from_stash(stash_root, fields=["id"],
+                fast_decode=fast_decode)
+        manifest = g.get_manifest(rescan=rescan)
+        print("manifest: {} gids".format(len(manifest)))
+        if incremental:
+            changed, removed = g.update_rollup(groups_file, workers=workers)
+            print("updated: {} gids read, {} gids removed".format(
+                len(changed), len(removed)))
+        elif binary:
+            g.write_binary(groups_file, workers=workers)
+        else:
+            with click.open_file(groups_file, "w") as ofp:
+                g.write_member_ids(groups_file, workers=workers)
+        if member_groups_file:
+            if binary:
+                g_rollup = GroupsData.from_binary(groups_file)
+            else:
+                g_rollup = GroupsData.from_file(groups_file)
+            g_rollup.write_member_groups(member_groups_file)
         if check:
-            g_gids = g.get_gids()
-            g2 = GroupsData.from_file(groups_file)
-            g2_gids = g2.get_gids()
-            len_gids = len(g_gids)
-            len_gids2 = len(g2_gids)
-            if len_gids == len_gids2 and sorted(g_gids) == sorted(g2_gids):
+            stash_manifest = StashManifest.from_file(
+                    StashManifest.path_for(stash_root))
+            rollup_manifest = StashManifest.from_file(
+                    StashManifest.path_for_rollup(groups_file))
+            changed, removed = stash_manifest.diff(rollup_manifest)
+            if not changed and not removed:
                 print("ok: checked {} gids in stash and groups file".format(
-                    len(g_gids)))
+                    len(stash_manifest)))
             else:
-                len_gids = len(g_gids)
-                len_gids2 = len(g2_gids)
-                print("mismatch: stash and groups file have different gids!")
+                print("mismatch: stash and groups file have different gids!"
+                        " {} new or changed in stash, {} only in groups"
+                        " file".format(len(changed), len(removed)))
                 sys.exit(1)
     go()
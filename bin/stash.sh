@@ -18,10 +18,13 @@ Options
     
 Commands
 
-    install     Moves each file to \"pre/blah_/1/2/1234.ext\".
+    install     Moves each file to \"pre/blah_/1/2/1234.ext\" and records it
+                in the stash manifest \"pre/blah_.manifest\", which is first
+                built from the files already in the stash if it is missing.
 
-    exists      Only checks to see if the destination files exist. Exits 0 if
-                they all do, 1 if one or more do not.
+    exists      Only checks to see if the destination files exist, also
+                compressed or packed into an archive by pack-stash.py. Exits
+                0 if they all do, 1 if one or more do not.
 "'
 
 progname=$( basename "${0}" )
@@ -97,19 +100,47 @@ parse_filename ()
     vvecho "stash_path=${stash_path}"
 }
 
+archive_has ()
+# $1 - archive, $2 - member name
+# exits 0 if the zip archive $1 has a member $2
+{
+    python3 -c 'import sys, zipfile
+sys.exit(sys.argv[2] not in zipfile.ZipFile(sys.argv[1]).namelist())' \
+        "${1}" "${2}" 2>/dev/null
+}
+
 check_exists ()
 # $1 - file
+# the group file may also have been compressed (.json.gz, .json.xz) or packed
+# into the shard archive pre/blah_/1/2.zip by pack-stash.py
 {
     parse_filename "${1}"
     case ${stash_path} in
     (${store_name}/[0-9]/[0-9])
-        if [ ! -f "${prefix}/${stash_path}/${group_id}${ext}" ]
+        local found stashed_ext
+        unset found
+        for stashed_ext in "${ext}" .json .json.gz .json.xz
+        do
+            if [ -f "${prefix}/${stash_path}/${group_id}${stashed_ext}" ]
+            then
+                found=${prefix}/${stash_path}/${group_id}${stashed_ext}
+                break
+            fi
+        done
+        if [ -z "${found+isset}" ] \
+            && [ -f "${prefix}/${stash_path}.zip" ] \
+            && archive_has "${prefix}/${stash_path}.zip" "${group_id}.json"
         then
+            found=${prefix}/${stash_path}.zip:${group_id}.json
+        fi
+        case ${found+isset} in
+        (isset)
+            vecho "exists: ${found}" ;;
+        (*)
             vecho "does not exist: ${prefix}/${stash_path}/${group_id}${ext}"
             status=1
-        else
-            vecho "exists: ${prefix}/${stash_path}/${group_id}${ext}"
-        fi
+            ;;
+        esac
         ;;
     (*)
         emsg "bad stash path: '${stash_path}'"
@@ -119,6 +150,64 @@ check_exists ()
 
 }
 
+manifest_line ()
+# $1 - stashed file, $2 - its path relative to the stash
+# prints the manifest line "gid path size mtime members" of a group file
+{
+    local file=${1:?"manifest_line: missing file!"}
+    local path=${2:?"manifest_line: missing path!"}
+    local fname gid size mtime members
+    fname=${path##*/}
+    gid=${fname%%.*}
+    size=$(( $( wc -c < "${file}" ) ))
+    mtime=$( stat -c %Y "${file}" 2>/dev/null || stat -f %m "${file}" )
+    case ${fname} in
+    (*.gz)
+        members=$(( $( gzip -dc "${file}" | wc -l ) )) ;;
+    (*.xz)
+        members=$(( $( xz -dc "${file}" | wc -l ) )) ;;
+    (*)
+        members=$(( $( wc -l < "${file}" ) )) ;;
+    esac
+    printf '%s\t%s\t%s\t%s\t%s\n' "${gid}" "${path}" "${size}" "${mtime}" \
+        "${members}"
+}
+
+manifest_init ()
+# writes the manifest of a stash that has none from the group files already
+# in it, so that the manifest lists the whole stash once manifest_add starts
+# appending to it; a packed stash always has one (see pack-stash.py)
+{
+    local manifest=${prefix}/${store_name}.manifest
+    local path
+    [ -f "${manifest}" ] && return
+    if [ -d "${prefix}/${store_name}" ]
+    then
+        ( cd "${prefix}/${store_name}" && find . -mindepth 3 -maxdepth 3 \
+            -type f -name '*.json*' ) | sort | while read path
+        do
+            path=${path#./}
+            manifest_line "${prefix}/${store_name}/${path}" "${path}"
+        done > "${manifest}.tmp"
+    else
+        : > "${manifest}.tmp"
+    fi
+    mv "${manifest}.tmp" "${manifest}"
+    vecho "manifest: ${manifest}: initialized"
+}
+
+manifest_add ()
+# $1 - installed file
+# appends "gid path size mtime members" to the manifest of the stash; a later
+# line for a gid replaces an earlier one (see StashManifest in meetupdata.py)
+{
+    local file=${1:?"manifest_add: missing file!"}
+    manifest_line "${file}" \
+        "${first_digit}/${second_digit}/${group_id}${ext}" \
+        >> "${prefix}/${store_name}.manifest"
+    vecho "manifest: ${prefix}/${store_name}.manifest: ${group_id}"
+}
+
 stash_file ()
 # $1 - file
 {
@@ -127,8 +216,20 @@ stash_file ()
     then
         case ${stash_path} in
         (${store_name}/[0-9]/[0-9])
+            case ${dry_run+isset} in
+            (isset)
+                ;;
+            (*)
+                manifest_init ;;
+            esac
             run mkdir -p "${prefix}/${stash_path}"
             run mv "${f}" "${prefix}/${stash_path}/${group_id}${ext}"
+            case ${dry_run+isset} in
+            (isset)
+                ;;
+            (*)
+                manifest_add "${prefix}/${stash_path}/${group_id}${ext}" ;;
+            esac
             ;;
         (*)
             emsg "bad stash path: '${stash_path}'"
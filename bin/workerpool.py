@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import multiprocessing
+
+dflt_shards_per_worker = 8
+
+# Read-only data shared with forked worker processes. The parent process
+# fills it in before the pool is forked, so that the workers all read the
+# same copy-on-write pages instead of each receiving the data pickled, and
+# clears it when the pool is done.
+shared = dict()
+
+
+def make_shards(num_nodes, workers):
+    """
+    Split the node numbers 0..num_nodes-1 into contiguous (start, stop)
+    shards of equal size, several per worker so that the pool stays busy
+    when some shards have much more work than others.
+    """
+    num_shards = max(1, workers * dflt_shards_per_worker)
+    shard_size = max(1, -(-num_nodes // num_shards))
+    return [(start, min(start + shard_size, num_nodes))
+            for start in range(0, num_nodes, shard_size)]
+
+
+def make_triangle_shards(num_nodes, workers):
+    """
+    Split the node numbers 0..num_nodes-1 into contiguous (start, stop)
+    shards, several per worker. Node a is the first node of about
+    (num_nodes - a)**2 / 2 triangles, so the shard boundaries are placed to
+    give each shard roughly the same number of triangles to check, which
+    makes the shards near the start of the node list the smallest.
+    """
+    num_shards = max(1, workers * dflt_shards_per_worker)
+    bounds = [0]
+    for s in range(1, num_shards + 1):
+        bound = num_nodes - int(round(num_nodes * (1 - s / num_shards) ** (1/3)))
+        if bound > bounds[-1]:
+            bounds.append(bound)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def map_tasks(func, tasks, workers, ordered=True):
+    """
+    Generate func(task) for each task. With workers > 1 the tasks are
+    processed by a pool of forked worker processes, which inherit the data
+    in shared without copying or pickling it, and the results come in task
+    order if ordered, or else as they are done.
+    """
+    if workers <= 1:
+        yield from map(func, tasks)
+        return
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(workers) as pool:
+        if ordered:
+            yield from pool.imap(func, tasks)
+        else:
+            yield from pool.imap_unordered(func, tasks)
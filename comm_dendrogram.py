@@ -1,44 +1,95 @@
 #!/usr/bin/env python
 
 import click
+import collections
 import community
 import json
 import networkx as nx
 import matplotlib.pyplot as plt
+import os
 from pprint import pformat
 import sys
-import gids2names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    "bin"))
+import csrlouvain
+from groupgraph import GroupGraphGen
+from meetupdata import GroupGidMap
 
 #better with karate_graph() as defined in networkx example.
 #erdos renyi don't have true community structure
 #G = nx.erdos_renyi_graph(30, 0.05)
 
 dflt_resolution = 0.5
+dflt_groups_file = "data/groups.txt"
+engines = ["csr", "networkx"]
+dflt_engine = "csr"
 
-def gen_clusters(edges_file, resolution=dflt_resolution):
-    with open(edges_file, "rb") as fp:
-        G = nx.read_weighted_edgelist(fp)
+def load_graph(edges_file, engine=dflt_engine):
+    """
+    Return the graph in edges_file and the module with the Louvain functions
+    for it: a CsrGraph and csrlouvain, or a networkx Graph and community
+    (python-louvain).
+    """
+    if engine == "csr":
+        return csrlouvain.CsrGraph.from_path(edges_file), csrlouvain
+    if os.path.splitext(edges_file)[1] == ".bin":
+        G = nx.Graph()
+        G.add_weighted_edges_from(GroupGraphGen.from_binary(edges_file))
+    else:
+        with open(edges_file, "rb") as fp:
+            G = nx.read_weighted_edgelist(fp)
+    return G, community
 
-    dendrogram = community.generate_dendrogram(G, resolution=0.25)
-    len_d = len(dendrogram)
-    print("{} items in dendrogram".format(len_d))
+def load_names(G, groups_file=dflt_groups_file):
+    """
+    Return a dict of the group names of the nodes of G, as
+    GroupGidMap.get_many() does.
+    """
+    gid_map = GroupGidMap.from_file(groups_file)
+    return gid_map.get_many(G.nodes(), keys=["name"])
 
-    gids2names.load_groups_file("data/groups.txt")
+def write_clusters(G, louvain, dendrogram, names, file=None):
+    """
+    Print the partition, modularity and communities (with the group names
+    of their nodes) at each level of dendrogram to file (default stdout).
+    Return the list of the modularities of the levels.
+    """
+    len_d = len(dendrogram)
+    print("{} items in dendrogram".format(len_d), file=file)
 
+    modularities = []
     for level in range(len_d):
-        print()
-        partition = community.partition_at_level(dendrogram, level)
-        modularity = community.modularity(partition, G)
-        print("partition at level {} is\n{}".format(level, pformat(partition)))
-        print("modularity at level {} is {}".format(level, modularity))
+        print(file=file)
+        partition = louvain.partition_at_level(dendrogram, level)
+        modularity = louvain.modularity(partition, G)
+        modularities.append(modularity)
+        print("partition at level {} is\n{}".format(level, pformat(partition)),
+                file=file)
+        print("modularity at level {} is {}".format(level, modularity),
+                file=file)
+        community_nodes = collections.defaultdict(list)
+        for node, com in partition.items():
+            community_nodes[com].append(node)
         for com in set(partition.values()):
-            list_nodes = sorted([nodes for nodes in partition.keys()
-                            if partition[nodes] == com])
-            print("nodes: {}".format(json.dumps(list_nodes)))
-            print("    groups:")
-            for gid, name in gids2names.generate_group_names(
-                    group_ids_list=list_nodes):
-                print("    {} {}".format(gid, name))
+            list_nodes = sorted(community_nodes[com])
+            print("nodes: {}".format(json.dumps(list_nodes)), file=file)
+            print("    groups:", file=file)
+            for gid in list_nodes:
+                name = names.get(gid, {}).get("name", None)
+                print("    {} {}".format(gid, name), file=file)
+    return modularities
+
+def gen_clusters(edges_file, resolution=dflt_resolution,
+        groups_file=dflt_groups_file, engine=dflt_engine,
+        partition_file=None, seed=None):
+    G, louvain = load_graph(edges_file, engine=engine)
+    dendrogram = louvain.generate_dendrogram(G, resolution=resolution,
+            random_state=seed)
+    names = load_names(G, groups_file=groups_file)
+    write_clusters(G, louvain, dendrogram, names)
+    if partition_file:
+        csrlouvain.write_partition(partition_file,
+                louvain.partition_at_level(dendrogram, len(dendrogram) - 1))
 
 ##drawing
 #size = float(len(set(partition.values())))
@@ -58,11 +109,26 @@ def gen_clusters(edges_file, resolution=dflt_resolution):
 
 @click.command()
 @click.option('--edges-file', 'edges_file', type=click.Path(),
-        help='File of graph edges.')
+        help='File of graph edges (NCOL, or binary with extension .bin).')
 @click.option('--resolution', 'resolution', default=dflt_resolution,
         help='Time parameter.')
-def go(edges_file, resolution):
-    gen_clusters(edges_file, resolution=0.5)
+@click.option('--groups-file', 'groups_file', type=click.Path(),
+        default=dflt_groups_file,
+        help='File of group information (.json, .txt or .db).')
+@click.option('--engine', 'engine', type=click.Choice(engines),
+        default=dflt_engine,
+        help=('Louvain implementation: csr (NumPy, on a sparse matrix) or'
+                ' networkx (python-louvain).'))
+@click.option('--partition-file', 'partition_file', type=click.Path(),
+        help=('Also write the top level partition to this file, for'
+                ' comm_update.py.'))
+@click.option('--seed', 'seed', type=int,
+        help=('Seed of the random order the nodes are visited in, for'
+                ' reproducible communities (default: a different order on'
+                ' each run).'))
+def go(edges_file, resolution, groups_file, engine, partition_file, seed):
+    gen_clusters(edges_file, resolution=resolution, groups_file=groups_file,
+            engine=engine, partition_file=partition_file, seed=seed)
 
 if __name__ == '__main__':
     go()
@@ -3,17 +3,30 @@
 import community
 import networkx as nx
 import matplotlib.pyplot as plt
+import os
 import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    "bin"))
+import csrlouvain
 
 #better with karate_graph() as defined in networkx example.
 #erdos renyi don't have true community structure
 #G = nx.erdos_renyi_graph(30, 0.05)
 
-with open(sys.argv[1], "rb") as fp:
-    G = nx.read_weighted_edgelist(fp)
+#usage: comm_partitions.py edges_file [csr|networkx]
+engine = sys.argv[2] if len(sys.argv) > 2 else "csr"
 
-#first compute the best partition
-partition = community.best_partition(G)
+if engine == "csr":
+    #the CSR engine finds the partition, networkx only draws it
+    C = csrlouvain.CsrGraph.from_path(sys.argv[1])
+    partition = csrlouvain.best_partition(C)
+    G = C.to_networkx()
+else:
+    with open(sys.argv[1], "rb") as fp:
+        G = nx.read_weighted_edgelist(fp)
+
+    #first compute the best partition
+    partition = community.best_partition(G)
 
 #drawing
 size = float(len(set(partition.values())))
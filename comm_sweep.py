@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+import click
+import os
+import sys
+import time
+from comm_dendrogram import dflt_engine
+from comm_dendrogram import dflt_groups_file
+from comm_dendrogram import engines
+from comm_dendrogram import load_graph
+from comm_dendrogram import load_names
+from comm_dendrogram import write_clusters
+import csrlouvain
+from workerpool import map_tasks
+from workerpool import shared
+
+dflt_out_dir = "clusters"
+dflt_suffix = "cluster"
+dflt_workers = os.cpu_count() or 1
+
+
+def parse_resolutions(resolutions=None, resolution_range=None):
+    """
+    Return the list of resolutions, as the strings that name the cluster
+    files, from resolutions, a comma-separated list, and resolution_range,
+    a (start, stop, step) tuple that includes stop. A resolution given more
+    than once, even spelled differently (1, 1.0), is kept the first time
+    only.
+    """
+    values = []
+    if resolutions:
+        for value in resolutions.split(","):
+            value = value.strip()
+            float(value)
+            values.append(value)
+    if resolution_range:
+        start, stop, step = resolution_range
+        if step <= 0:
+            raise ValueError("resolution step must be positive")
+        i = 0
+        while start + i * step <= stop + step / 1000:
+            values.append(str(round(start + i * step, 10)))
+            i += 1
+    seen = set()
+    unique = []
+    for value in values:
+        if float(value) not in seen:
+            seen.add(float(value))
+            unique.append(value)
+    return unique
+
+
+def cluster_file_for(out_dir, resolution, suffix=dflt_suffix):
+    return os.path.join(out_dir, "r{}_{}.txt".format(resolution, suffix))
+
+
+def partition_file_for(cluster_file):
+    return os.path.splitext(cluster_file)[0] + ".part"
+
+
+def _sweep_worker(task):
+    """
+    Worker for sweep(): run the Louvain method on the graph in shared at
+    one resolution and write the cluster file, and the top level partition
+    (see csrlouvain.write_partition()) next to it with the extension
+    .part. Return the summary row.
+    """
+    resolution, cluster_file = task
+    graph, louvain = shared["graph"], shared["louvain"]
+    start_time = time.time()
+    dendrogram = louvain.generate_dendrogram(graph,
+            resolution=float(resolution), random_state=shared["seed"])
+    tmp_file = cluster_file + ".tmp"
+    with open(tmp_file, "w") as cfp:
+        modularities = write_clusters(graph, louvain, dendrogram,
+                shared["names"], file=cfp)
+    os.replace(tmp_file, cluster_file)
+    partition = louvain.partition_at_level(dendrogram, len(dendrogram) - 1)
+    csrlouvain.write_partition(partition_file_for(cluster_file), partition)
+    return (resolution, len(dendrogram), modularities[-1],
+            len(set(partition.values())), time.time() - start_time)
+
+
+def sweep(edges_file, resolutions, out_dir=dflt_out_dir, suffix=dflt_suffix,
+        groups_file=dflt_groups_file, engine=dflt_engine,
+        workers=dflt_workers, seed=None):
+    """
+    Run the Louvain method on the graph in edges_file at each of the
+    resolutions, in a pool of workers processes, writing the clusters of
+    each to out_dir/r<resolution>_<suffix>.txt. The graph and the group
+    names are loaded once into shared, before the pool is forked (see
+    workerpool.map_tasks()). Generate the summary rows (resolution, levels,
+    modularity, communities, runtime) as the runs finish. Each run visits
+    the nodes in the random order seeded by seed, if given.
+    """
+    graph, louvain = load_graph(edges_file, engine=engine)
+    names = load_names(graph, groups_file=groups_file)
+    shared.update(graph=graph, louvain=louvain, names=names, seed=seed)
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = [(_, cluster_file_for(out_dir, _, suffix=suffix))
+            for _ in resolutions]
+    try:
+        yield from map_tasks(_sweep_worker, tasks,
+                min(workers, len(tasks)), ordered=False)
+    finally:
+        shared.clear()
+
+
+@click.command()
+@click.option('--edges-file', 'edges_file', type=click.Path(exists=True),
+        required=True,
+        help='File of graph edges (NCOL, or binary with extension .bin).')
+@click.option('--resolutions', 'resolutions',
+        help='Comma-separated list of resolutions, e.g. 0.25,0.5,1.0.')
+@click.option('--resolution-range', 'resolution_range', nargs=3, type=float,
+        help='Resolutions from START to STOP (included) by STEP.')
+@click.option('--out-dir', 'out_dir', type=click.Path(),
+        default=dflt_out_dir,
+        help='Directory for the cluster files and the summary.')
+@click.option('--suffix', 'suffix', default=dflt_suffix,
+        help=('Cluster files are named r<resolution>_<suffix>.txt, e.g.'
+                ' --suffix cluster_min_weight_10.'))
+@click.option('--groups-file', 'groups_file', type=click.Path(),
+        default=dflt_groups_file,
+        help='File of group information (.json, .txt or .db).')
+@click.option('--engine', 'engine', type=click.Choice(engines),
+        default=dflt_engine,
+        help=('Louvain implementation: csr (NumPy, on a sparse matrix) or'
+                ' networkx (python-louvain).'))
+@click.option('--workers', 'workers', default=dflt_workers,
+        help='Number of worker processes, one resolution each at a time.')
+@click.option('--seed', 'seed', type=int,
+        help=('Seed of the random order the nodes are visited in, for'
+                ' reproducible communities (default: a different order on'
+                ' each run).'))
+def go(edges_file, resolutions, resolution_range, out_dir, suffix,
+        groups_file, engine, workers, seed):
+    """
+    Run comm_dendrogram.py's community detection over a sweep of
+    resolutions, in parallel, writing one cluster file and one partition
+    file (.part, for compare-partitions.py) per resolution and a summary
+    table, summary_<suffix>.tsv, to out-dir.
+    """
+    print("edges_file: {}".format(edges_file))
+    print("resolutions: {}".format(resolutions))
+    print("resolution_range: {}".format(resolution_range))
+    print("out_dir: {}".format(out_dir))
+    print("suffix: {}".format(suffix))
+    print("groups_file: {}".format(groups_file))
+    print("engine: {}".format(engine))
+    print("workers: {}".format(workers))
+    print("seed: {}".format(seed))
+    try:
+        resolutions = parse_resolutions(resolutions, resolution_range)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    if not resolutions:
+        raise click.UsageError(
+                "give --resolutions and/or --resolution-range")
+    start_time = time.time()
+    rows = []
+    for row in sweep(edges_file, resolutions, out_dir=out_dir, suffix=suffix,
+            groups_file=groups_file, engine=engine, workers=workers,
+            seed=seed):
+        print("resolution {}: {} levels, modularity {:.6f}, {} communities,"
+                " {:.1f}s".format(*row))
+        sys.stdout.flush()
+        rows.append(row)
+    rows.sort(key=lambda row: float(row[0]))
+    summary_file = os.path.join(out_dir, "summary_{}.tsv".format(suffix))
+    with open(summary_file, "w") as sfp:
+        print("resolution\tlevels\tmodularity\tcommunities\truntime",
+                file=sfp)
+        for row in rows:
+            print("{}\t{}\t{}\t{}\t{:.3f}".format(*row), file=sfp)
+    print("wrote {} cluster files and {} in {:.1f}s".format(len(rows),
+        summary_file, time.time() - start_time))
+
+if __name__ == '__main__':
+    go()
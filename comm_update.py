@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+import click
+import time
+from comm_dendrogram import dflt_groups_file
+from comm_dendrogram import dflt_resolution
+from comm_dendrogram import load_names
+from comm_dendrogram import write_clusters
+import csrlouvain
+from groupgraph import GroupGraphGen
+
+
+@click.command()
+@click.option('--edges-file', 'edges_file', type=click.Path(exists=True),
+        required=True,
+        help=('File of the graph edges the partition was found on (NCOL, or'
+                ' binary with extension .bin).'))
+@click.option('--delta-file', 'delta_file', type=click.Path(exists=True),
+        help=('File of edges (NCOL or .bin) to set to their weights: new'
+                ' edges are added, weight 0 removes an edge.'))
+@click.option('--new-edges-file', 'new_edges_file',
+        type=click.Path(exists=True),
+        help='File of the rebuilt graph edges, to diff with --edges-file.')
+@click.option('--partition-file', 'partition_file',
+        type=click.Path(exists=True), required=True,
+        help='Previous partition (see comm_dendrogram.py --partition-file).')
+@click.option('--out-file', 'out_file', type=click.Path(), required=True,
+        help='File to write the updated partition to.')
+@click.option('--resolution', 'resolution', default=dflt_resolution,
+        help='Resolution the partition was found with.')
+@click.option('--clusters-file', 'clusters_file', type=click.Path(),
+        help='Also write the updated clusters, as comm_dendrogram.py does.')
+@click.option('--groups-file', 'groups_file', type=click.Path(),
+        default=dflt_groups_file,
+        help='File of group information (.json, .txt or .db).')
+@click.option('--seed', 'seed', type=int,
+        help=('Seed of the random order the nodes are visited in, for'
+                ' reproducible communities (default: a different order on'
+                ' each run).'))
+def go(edges_file, delta_file, new_edges_file, partition_file, out_file,
+        resolution, clusters_file, groups_file, seed):
+    """
+    Update a partition of the group graph after its edges changed, either
+    by the edges in --delta-file or to those in --new-edges-file, without
+    recomputing it from scratch: only the communities of the groups whose
+    edges changed, and the neighbours of those groups, are re-optimized
+    (see csrlouvain.update_dendrogram()).
+    """
+    print("edges_file: {}".format(edges_file))
+    print("delta_file: {}".format(delta_file))
+    print("new_edges_file: {}".format(new_edges_file))
+    print("partition_file: {}".format(partition_file))
+    print("out_file: {}".format(out_file))
+    print("resolution: {}".format(resolution))
+    print("clusters_file: {}".format(clusters_file))
+    print("seed: {}".format(seed))
+    if (delta_file is None) == (new_edges_file is None):
+        raise click.UsageError(
+                "give one of --delta-file and --new-edges-file")
+    start_time = time.time()
+    G = csrlouvain.CsrGraph.from_path(edges_file)
+    if delta_file:
+        G, changed = G.apply_delta(GroupGraphGen.from_path(delta_file))
+    else:
+        new_G = csrlouvain.CsrGraph.from_path(new_edges_file)
+        changed = new_G.changed_nodes(G)
+        G = new_G
+    partition = csrlouvain.read_partition(partition_file)
+    print("read {} nodes, {} in the partition, {} changed".format(len(G),
+        len(partition), len(changed)))
+    dendrogram = csrlouvain.update_dendrogram(G, partition, changed,
+            resolution=resolution, random_state=seed)
+    partition = csrlouvain.partition_at_level(dendrogram,
+            len(dendrogram) - 1)
+    csrlouvain.write_partition(out_file, partition)
+    print("modularity {}, {} communities, {:.1f}s".format(
+        csrlouvain.modularity(partition, G), len(set(partition.values())),
+        time.time() - start_time))
+    if clusters_file:
+        names = load_names(G, groups_file=groups_file)
+        with open(clusters_file, "w") as cfp:
+            write_clusters(G, csrlouvain, dendrogram, names, file=cfp)
+
+if __name__ == '__main__':
+    go()